@@ -1,23 +1,42 @@
 #!/usr/bin/env python
 
 import cvmfs
+import download_scheduler
+import hash_set
+import optparse
 import os
 import sys
+import threading
+import throttled_fetcher
+import time
 import zlib
+import Queue
+
+from mirror_journal import MirrorJournal
 
 def usage():
-    print sys.argv[0] + " <repo url/path> <download destination> [<history depth>]"
+    print sys.argv[0] + " [options] <repo url/path> <download destination> [<history depth>]"
     print "Downloads the whole catalog graph of a given repository."
     print "The optional <history depth> puts a threshold on how many historic"
     print "catalog tree revisions should be downloaded (default: 0 i.e. all)"
+    print "Downloads can be rate limited per host with --max-bandwidth and"
+    print "--max-requests (see --help)."
+    print "Mirrored catalogs are journaled in the destination: interrupted runs"
+    print "resume and repeated runs only download the new revisions."
+
+parser = optparse.OptionParser()
+parser.add_option("-j", "--jobs", type="int", dest="jobs", default=8,
+                  help="number of concurrent catalog downloads (default: 8)")
+download_scheduler.add_rate_limit_options(parser)
+(options, args) = parser.parse_args()
 
-if len(sys.argv) < 3 or len(sys.argv) > 4:
+if len(args) < 2 or len(args) > 3:
     usage()
     sys.exit(1)
 
-dest  = os.path.normpath(sys.argv[2])
-url   = sys.argv[1]
-depth = sys.argv[3] if len(sys.argv) == 4 else 0
+dest  = os.path.normpath(args[1])
+url   = args[0]
+depth = args[2] if len(args) == 3 else 0
 
 try:
     depth = int(depth)
@@ -27,92 +46,273 @@ except ValueError, e:
     print "<history depth> needs to be an integer"
     sys.exit(1)
 
+# checked before the journal is written into it
+if not os.path.isdir(dest) or not os.access(dest, os.W_OK | os.X_OK):
+    usage()
+    print
+    print "<download destination> needs to exist and be writable"
+    sys.exit(1)
+
+
+
+class CatalogGraphDownloader(object):
+    """ downloads catalog graphs with a pool of worker threads
 
+    Catalog hashes are queued as soon as the catalog referencing them has been
+    downloaded and opened, so the workers always see the whole known frontier.
+    Every hash is queued only once (visited_hashes).  Root catalogs carry the
+    number of their revision in the walk to follow the predecessor chain.
+    With a MirrorJournal, catalog trees mirrored completely before are not
+    walked again and the walk stops at a revision whose history is mirrored.
+    """
+    def __init__(self, repo, workers, depth, visited_hashes = None, journal = None):
+        self.repo             = repo
+        self.workers          = workers
+        self.depth            = depth
+        self.visited_hashes   = visited_hashes if visited_hashes is not None \
+                                               else hash_set.HashSet()
+        self.journal          = journal
+        self.queue            = Queue.Queue()
+        self.lock             = threading.Lock()
+        self.errors           = []
+        self.roots            = []
+        self.skipped          = 0
+        self.history_complete = False
 
-class MerkleCatalogTreeIterator(cvmfs.CatalogTreeIterator):
-    def __init__(self, repository, root_catalog, visited_hashes = set()):
-        cvmfs.CatalogTreeIterator.__init__(self, repository, root_catalog)
-        self.visited_hashes = visited_hashes
+    def download(self, root_hash):
+        """ downloads everything reachable from root_hash, returns the errors """
+        self._enqueue(root_hash, 1)
+        threads = [ threading.Thread(target = self._work) for i in range(self.workers) ]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        # Queue.join() and Thread.join() without a timeout cannot be
+        # interrupted in python 2, so poll to keep Ctrl-C working
+        while self.queue.unfinished_tasks:
+            time.sleep(0.2)
+        for thread in threads:
+            self.queue.put(None)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+        return self.errors
+
+    def _enqueue(self, catalog_hash, revision):
+        with self.lock:
+            if catalog_hash in self.visited_hashes:
+                return
+            self.visited_hashes.add(catalog_hash)
+            if self.journal is not None:
+                if revision is not None and \
+                   self.journal.is_history_complete(catalog_hash):
+                    self.skipped += 1
+                    self.history_complete = True
+                    print "reached a revision that is mirrored completely"
+                    return
+                if revision is None and self.journal.is_complete(catalog_hash):
+                    self.skipped += 1
+                    return
+        self.queue.put((catalog_hash, revision))
+
+    def _log(self, *message):
+        with self.lock:
+            print " ".join([ str(part) for part in message ])
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                self._process(*item)
+            except Exception, e:
+                with self.lock:
+                    self.errors.append((item[0], e))
+            finally:
+                self.queue.task_done()
+
+    def _process(self, catalog_hash, revision):
+        try:
+            catalog = self.repo.retrieve_catalog(catalog_hash)
+        except cvmfs.repository.FileNotFoundInRepository, e:
+            if revision is None or revision == 1:
+                raise
+            with self.lock:
+                self.visited_hashes.discard(catalog_hash)
+                self.history_complete = True
+            self._log("next root catalog not found (garbage collected?)")
+            return
+
+        try:
+            for nested in catalog.list_nested():
+                self._enqueue(nested.hash, None)
+            if revision is not None:
+                with self.lock:
+                    self.roots.append(catalog_hash)
+                self._log("Downloading revision", catalog.revision, "...")
+                self._follow_predecessor(catalog, revision)
+        finally:
+            self.repo.close_catalog(catalog)
 
-    def next(self):
-        catalog = cvmfs.CatalogTreeIterator.next(self)
-        self.visited_hashes.add(catalog.hash)
-        return catalog
+    def _follow_predecessor(self, root_catalog, revision):
+        if self.depth > 0 and revision >= self.depth:
+            self._log("all requested catalog tree revisions downloaded")
+            return
+        predecessor = root_catalog.get_predecessor()
+        if predecessor is None:
+            with self.lock:
+                self.history_complete = True
+            self._log("reached the end of the catalog chain")
+            return
+        self._enqueue(predecessor.hash, revision + 1)
 
-    def _push_catalog_wrapper(self, catalog):
-        if not catalog.catalog_reference or \
-               catalog.catalog_reference.hash not in self.visited_hashes:
-            cvmfs.CatalogTreeIterator._push_catalog_wrapper(self, catalog)
 
-class DownloadingRemoteFetcher(cvmfs.RemoteFetcher):
-    def __init__(self, repo_url, destination):
-        super(DownloadingRemoteFetcher, self).__init__(repo_url)
+class TeeWriter(object):
+    """ file-like sink that, in one pass over the downloaded stream, writes the
+        compressed bytes to the mirror file, hashes them and writes the inflated
+        bytes to the cache file (inflating at most max_chunk bytes at a time) """
+    def __init__(self, mirror_file, cached_file, hasher = None, inflate = True,
+                 max_chunk = 1024 * 1024):
+        self.mirror_file  = mirror_file
+        self.cached_file  = cached_file
+        self.hasher       = hasher
+        self.decompressor = zlib.decompressobj() if inflate else None
+        self.max_chunk    = max_chunk
+
+    def write(self, data):
+        if self.mirror_file is not None:
+            self.mirror_file.write(data)
+        if self.hasher is not None:
+            self.hasher.update(data)
+        if self.decompressor is None:
+            self.cached_file.write(data)
+            return
+        # python 2 keeps data after the end of the stream in unconsumed_tail
+        while data and not self.decompressor.unused_data:
+            self.cached_file.write(self.decompressor.decompress(data, self.max_chunk))
+            data = self.decompressor.unconsumed_tail
+
+    def flush(self):
+        if self.mirror_file is not None:
+            self.mirror_file.flush()
+
+    def finish(self):
+        """ writes what is left in the decompressor, returns the hex digest """
+        if self.decompressor is not None:
+            self.cached_file.write(self.decompressor.flush())
+        return self.hasher.hexdigest() if self.hasher is not None else None
+
+
+class DownloadingRemoteFetcher(throttled_fetcher.ThrottledRemoteFetcher):
+    def __init__(self, repo_url, destination, scheduler = None, journal = None):
+        super(DownloadingRemoteFetcher, self).__init__(repo_url, scheduler)
         self.destination = destination
+        self.journal     = journal
+        self.downloaded  = 0
+        self.lock        = threading.Lock()
         self.__setup_destination()
 
     def __setup_destination(self):
         data_dir = self.destination + "/data"
         try:
-            os.mkdir(data_dir, 0755)
+            if not os.path.isdir(data_dir):
+                os.mkdir(data_dir, 0755)
             for i in range(0x00, 0xff + 1):
-                new_folder = "{0:#0{1}x}".format(i, 4)[2:]
-                os.mkdir(data_dir + "/" + new_folder, 0755)
-        except ValueError, e:
+                new_folder = data_dir + "/" + "{0:#0{1}x}".format(i, 4)[2:]
+                if not os.path.isdir(new_folder):
+                    os.mkdir(new_folder, 0755)
+        except OSError, e:
             usage()
             print
             print "<download destination> needs to exist and be writable"
+            sys.exit(1)
+
+    def _catalog_hash(self, file_name):
+        match = MirrorJournal.object_name.match(file_name[len("data/"):])
+        if not file_name.startswith("data/") or match is None:
+            return None
+        return match.group(1) + match.group(2) + (match.group(3) or "")
 
     def _retrieve_file(self, file_name, cached_file):
-        file_url  = self._make_file_uri(file_name)
-        dest_file = self.destination + "/" + file_name
-        with open(dest_file, "w+") as f:
-            self._download_content_and_store(f, file_url)
-            f.seek(0)
-            decompressed_content = zlib.decompress(f.read())
-            cached_file.write(decompressed_content)
+        self._retrieve(file_name, cached_file, True)
 
     def _retrieve_raw_file(self, file_name, cached_file):
-        file_url  = self._make_file_uri(file_name)
-        dest_file = self.destination + "/" + file_name
-        with open(dest_file, "w+") as f:
-            self._download_content_and_store(f, file_url)
-            f.seek(0)
-            cached_file.write(f.read())
+        self._retrieve(file_name, cached_file, False)
+
+    def _retrieve(self, file_name, cached_file, inflate):
+        file_url     = self._make_file_uri(file_name)
+        dest_file    = self.destination + "/" + file_name
+        catalog_hash = self._catalog_hash(file_name)
+        if catalog_hash and self.journal and self.journal.is_stored(catalog_hash):
+            tee = TeeWriter(None, cached_file, inflate = inflate)
+            with open(dest_file, "rb") as f:
+                for block in iter(lambda: f.read(64 * 1024), ""):
+                    tee.write(block)
+            tee.finish()
+            return
+        hasher, expected_digest = None, None
+        if catalog_hash:
+            hasher, expected_digest = MirrorJournal.new_hasher(file_name[len("data/"):])
+        try:
+            with open(dest_file + ".part", "wb") as f:
+                tee = TeeWriter(f, cached_file, hasher, inflate)
+                self._download_content_and_store(tee, file_url)
+                digest = tee.finish()
+            if digest != expected_digest:
+                raise IOError("content hash mismatch for " + file_name)
+        except:
+            if os.path.exists(dest_file + ".part"):
+                os.unlink(dest_file + ".part")
+            raise
+        os.rename(dest_file + ".part", dest_file)
+        if catalog_hash and self.journal:
+            self.journal.record("C", catalog_hash)
+        with self.lock:
+            self.downloaded += 1
 
 
 
-fetcher = DownloadingRemoteFetcher(url, dest)
-repo    = cvmfs.Repository.with_custom_fetcher(fetcher)
+scheduler = download_scheduler.scheduler_from_options(options)
+journal   = MirrorJournal(dest)
+
+adopted, missing = journal.scan()
+if adopted or missing:
+    print "Found" , adopted , "unjournaled catalogs in the destination," , \
+          missing , "journaled ones are gone"
+
+fetcher   = DownloadingRemoteFetcher(url, dest, scheduler, journal)
+repo      = cvmfs.Repository.with_custom_fetcher(fetcher)
 
 if depth == 0:
     print "Downloading entire catalog tree from " + repo.manifest.repository_name
 else:
     print "Downloading last" , depth , "catalog revisions from " + repo.manifest.repository_name
 
-root_clg       = repo.retrieve_root_catalog()
-visited_hashes = set()
-while True:
-    next_root_clg = root_clg.get_predecessor()
+root_clg   = repo.retrieve_root_catalog()
+root_hash  = root_clg.hash
+repo.close_catalog(root_clg)
 
-    for catalog in MerkleCatalogTreeIterator(repo, root_clg, visited_hashes):
-        if catalog.is_root():
-            print "Downloading revision" , catalog.revision , "..."
-        repo.close_catalog(catalog)
+downloader = CatalogGraphDownloader(repo, max(1, options.jobs), depth,
+                                    journal = journal)
+errors     = downloader.download(root_hash)
 
-    if depth > 0:
-        depth -= 1
-        if depth == 0:
-            print "all requested catalog tree revisions downloaded"
-            break
+for catalog_hash, error in errors:
+    print "failed to download catalog" , catalog_hash , ":" , error
 
-    if next_root_clg != None:
-        try:
-            root_clg = next_root_clg.retrieve_from(repo)
-        except cvmfs.repository.FileNotFoundInRepository, e:
-            print "next root catalog not found (garbage collected?)"
-            break
-    else:
-        print "reached the end of the catalog chain"
-        break
+# only a walk without errors guarantees that the visited trees are complete
+if not errors:
+    for catalog_hash in downloader.visited_hashes:
+        journal.record("T", catalog_hash)
+    if downloader.history_complete:
+        for catalog_hash in downloader.roots:
+            journal.record("H", catalog_hash)
+journal.close()
 
-print "Done (downloaded" , len(visited_hashes) , "catalogs)"
+print "Done (visited" , len(downloader.visited_hashes) , "catalogs," , \
+      fetcher.downloaded , "downloaded," , downloader.skipped , "already mirrored)"
+
+if options.throughput_report:
+    scheduler.report()
+
+if errors:
+    sys.exit(1)
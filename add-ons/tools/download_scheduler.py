@@ -0,0 +1,189 @@
+"""
+Download scheduling for the repository tools: per-host token buckets limit
+the request rate and the bandwidth, and downloads waiting for their turn are
+served by priority, so that catalogs go ahead of bulk file and chunk objects.
+"""
+
+import re
+import sys
+import time
+import heapq
+import itertools
+import threading
+import urlparse
+
+PRIORITY_METADATA = 0 # catalogs, manifest, certificate, history
+PRIORITY_FILE     = 1
+PRIORITY_CHUNK    = 2
+
+_object_suffix = re.compile(r"/data/[0-9a-f]{2}/[0-9a-f]+(?:-[a-z0-9]+)?([A-Z]?)$")
+
+def priority_for(file_url):
+    """ priority class of a repository URL (lower is more urgent) """
+    match = _object_suffix.search(urlparse.urlparse(file_url).path)
+    if match is None or match.group(1) in ("C", "H", "X", "M"):
+        return PRIORITY_METADATA
+    if match.group(1) == "P":
+        return PRIORITY_CHUNK
+    return PRIORITY_FILE
+
+
+def parse_rate(rate):
+    """ parses rates like '500', '200k', '10M' or '1G' (per second) """
+    if rate is None:
+        return None
+    multipliers = { "k" : 1024, "m" : 1024 ** 2, "g" : 1024 ** 3 }
+    rate = rate.strip().lower()
+    if rate and rate[-1] in multipliers:
+        return float(rate[:-1]) * multipliers[rate[-1]]
+    return float(rate)
+
+
+def format_rate(rate):
+    for unit in ("", "k", "M"):
+        if rate < 1024:
+            return "%.1f %s" % (rate, unit)
+        rate /= 1024.0
+    return "%.1f G" % rate
+
+
+class TokenBucket(object):
+    """ refills at rate tokens per second up to burst tokens, may go into debt
+
+    The bucket starts empty, a burst can only be saved up while idle.
+    """
+    def __init__(self, rate, burst = None):
+        self.rate      = float(rate)
+        self.burst     = float(burst or rate)
+        self.tokens    = 0.0
+        self.timestamp = time.time()
+
+    def take(self, amount, now):
+        """ takes the tokens and returns how long the next taker has to wait """
+        self.tokens    = min(self.burst,
+                             self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+        self.tokens   -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+
+class _HostState(object):
+    def __init__(self, max_bandwidth, max_requests):
+        self.bandwidth = TokenBucket(max_bandwidth) if max_bandwidth else None
+        self.requests  = TokenBucket(max_requests)  if max_requests  else None
+        self.waiting   = []
+        self.ready_at  = 0.0
+        self.count     = 0
+        self.bytes     = 0
+        self.started   = None
+        self.finished  = None
+
+
+class DownloadScheduler(object):
+    """ per-host rate limits with priority ordering of the waiting downloads
+
+    A download that gets its turn proceeds right away but puts its host into
+    debt; the next download for that host waits until the debt is paid and
+    the most urgent waiting download is served first.  Without limits, the
+    scheduler only keeps the statistics for the throughput report.
+    """
+    def __init__(self, max_bandwidth = None, max_requests = None):
+        self.max_bandwidth = max_bandwidth
+        self.max_requests  = max_requests
+        self._condition    = threading.Condition()
+        self._hosts        = {}
+        self._sequence     = itertools.count()
+
+    def acquire_request(self, host, priority = PRIORITY_FILE):
+        """ blocks until a new request to host may be sent """
+        self._acquire(host, priority, 1, 0)
+
+    def acquire_bytes(self, host, nbytes, priority = PRIORITY_FILE):
+        """ blocks until nbytes more may be transferred from host """
+        self._acquire(host, priority, 0, nbytes)
+
+    def report(self, out = sys.stderr):
+        """ prints the achieved throughput per host next to the configured caps """
+        with self._condition:
+            hosts = sorted(self._hosts.items())
+        for host, state in hosts:
+            if state.started is None:
+                continue
+            # the last transfer is done once its debt is paid off
+            finished = max(state.finished, state.ready_at)
+            elapsed  = max(finished - state.started, 1e-6)
+            print >> out, "%s: %d requests, %d bytes in %.1f s" % \
+                          (host, state.count, state.bytes, elapsed)
+            print >> out, "  bandwidth: %sB/s (cap: %s)" % \
+                          (format_rate(state.bytes / elapsed),
+                           format_rate(self.max_bandwidth) + "B/s" \
+                               if self.max_bandwidth else "none")
+            print >> out, "  requests:  %.1f/s (cap: %s)" % \
+                          (state.count / elapsed,
+                           "%.1f/s" % self.max_requests \
+                               if self.max_requests else "none")
+
+    def _host(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = _HostState(self.max_bandwidth, self.max_requests)
+        return self._hosts[host]
+
+    def _acquire(self, host, priority, nrequests, nbytes):
+        with self._condition:
+            state  = self._host(host)
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(state.waiting, ticket)
+            while True:
+                now = time.time()
+                if state.waiting[0] == ticket and now >= state.ready_at:
+                    break
+                # Condition.wait() needs a timeout to notice the debt is paid
+                timeout = state.ready_at - now if state.waiting[0] == ticket \
+                                               else None
+                self._condition.wait(timeout)
+            heapq.heappop(state.waiting)
+            delay = 0.0
+            if nrequests and state.requests:
+                delay = max(delay, state.requests.take(nrequests, now))
+            if nbytes and state.bandwidth:
+                delay = max(delay, state.bandwidth.take(nbytes, now))
+            state.ready_at  = now + delay
+            state.count    += nrequests
+            state.bytes    += nbytes
+            state.started   = state.started or now
+            state.finished  = now
+            self._condition.notify_all()
+
+
+class ThrottledWriter(object):
+    """ file wrapper that asks the scheduler before every block it writes """
+    def __init__(self, f, scheduler, host, priority):
+        self._file      = f
+        self._scheduler = scheduler
+        self._host      = host
+        self._priority  = priority
+
+    def write(self, data):
+        self._scheduler.acquire_bytes(self._host, len(data), self._priority)
+        self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def add_rate_limit_options(parser):
+    """ adds the rate limit options to an optparse.OptionParser """
+    parser.add_option("-b", "--max-bandwidth", dest="max_bandwidth",
+                      metavar="RATE", default=None,
+                      help="bytes per second and host (suffixes k, M, G)")
+    parser.add_option("-r", "--max-requests", dest="max_requests",
+                      metavar="RATE", default=None,
+                      help="requests per second and host")
+    parser.add_option("-t", "--throughput-report", action="store_true",
+                      dest="throughput_report", default=False,
+                      help="print the achieved throughput to stderr when done")
+
+
+def scheduler_from_options(options):
+    return DownloadScheduler(parse_rate(options.max_bandwidth),
+                             parse_rate(options.max_requests))
@@ -1,14 +1,28 @@
 #!/usr/bin/env python
 
+import os
 import sys
-import cvmfs
+import optparse
+import tempfile
+import download_scheduler
+import hash_set
+import throttled_fetcher
 
 def usage():
-    print sys.argv[0] + " <local repo name | remote repo url> [root catalog]"
+    print sys.argv[0] + " [options] <local repo name | remote repo url> [root catalog]"
     print "This script walks the catalogs and generates a list of all referenced content hashes."
+    print "Downloads can be rate limited per host with --max-bandwidth and"
+    print "--max-requests (see --help)."
+    print "With --stream, the hashes are sorted on disk within --memory-budget"
+    print "and printed sorted and deduplicated."
+    print "With --index, the hashes of every catalog are kept in the given directory"
+    print "so that repeated runs only query catalogs that were not seen before."
 
 # get referenced hashes from a single catalog (files, chunks, nested catalogs)
 def get_hashes_for_catalog(catalog):
+    return hash_set.HashSet(query_hashes_for_catalog(catalog))
+
+def query_hashes_for_catalog(catalog):
     print >> sys.stderr, "Processing" , catalog.hash , catalog
     query = "  SELECT DISTINCT           \
                  lower(hex(hash))        \
@@ -23,31 +37,149 @@ def get_hashes_for_catalog(catalog):
                SELECT DISTINCT           \
                  sha1 || 'C'             \
                FROM nested_catalogs;"
-    return { res[0] for res in catalog.run_sql(query) }
+    return ( res[0] for res in catalog.run_sql(query) )
 
-def get_hashes_for_catalog_tree(repo, root_catalog):
-    hashes = { root_catalog.hash + "C" }
+# hashes is a HashSet or, in streaming mode, an ExternalHashSorter
+def get_hashes_for_catalog_tree(repo, root_catalog, hashes):
+    hashes.add(root_catalog.hash + "C")
     for catalog in repo.catalogs(root_catalog):
-        hashes = hashes | get_hashes_for_catalog(catalog)
+        hashes.update(query_hashes_for_catalog(catalog))
         if not catalog.has_nested():
           repo.close_catalog(catalog)
     return hashes
 
-def get_hashes_for_revision(repo, root_hash = None):
+def get_hashes_for_revision(repo, root_hash = None, hashes = None):
     root_catalog = repo.retrieve_catalog(root_hash) if root_hash else repo.retrieve_root_catalog()
-    return get_hashes_for_catalog_tree(repo, root_catalog)
+    if hashes is None:
+        hashes = hash_set.HashSet()
+    return get_hashes_for_catalog_tree(repo, root_catalog, hashes)
+
+class CatalogHashIndex(object):
+    """ persistent referenced-hash sets of catalogs, stored by catalog hash
+
+    As catalogs are immutable, the set of a catalog never changes.  Every set
+    contains the nested catalogs ('C' suffix), so catalog trees can be walked
+    through the index without opening the catalogs.  The sets are files of
+    sorted hash_set records in <directory>/xx/<rest of the catalog hash>.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.queried   = 0
+        self.reused    = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def load(self, catalog_hash):
+        """ the HashSet of a catalog or None if it is not indexed """
+        try:
+            f = open(self._path(catalog_hash), "rb")
+        except IOError:
+            return None
+        with f:
+            data = f.read()
+        hashes = hash_set.HashSet(capacity = len(data) // hash_set.RECORD_SIZE)
+        for offset in xrange(0, len(data), hash_set.RECORD_SIZE):
+            hashes.add_record(data[offset:offset + hash_set.RECORD_SIZE])
+        return hashes
+
+    def store(self, catalog_hash, hashes):
+        path = self._path(catalog_hash)
+        if not os.path.isdir(os.path.dirname(path)):
+            try:
+                os.makedirs(os.path.dirname(path))
+            except OSError:
+                pass # created concurrently
+        with tempfile.NamedTemporaryFile("wb", dir = os.path.dirname(path),
+                                         delete = False) as f:
+            f.write("".join(hashes.sorted_records()))
+        os.rename(f.name, path)
+
+    def get_hashes_for_catalog(self, repo, catalog_hash):
+        hashes = self.load(catalog_hash)
+        if hashes is not None:
+            self.reused += 1
+            return hashes
+        catalog = repo.retrieve_catalog(catalog_hash)
+        hashes  = get_hashes_for_catalog(catalog)
+        repo.close_catalog(catalog)
+        self.store(catalog_hash, hashes)
+        self.queried += 1
+        return hashes
+
+    def _path(self, catalog_hash):
+        return os.path.join(self.directory, catalog_hash[:2], catalog_hash[2:])
+
+# like get_hashes_for_catalog_tree() but only unknown catalogs are opened
+def get_indexed_hashes_for_revision(repo, index, root_hash = None, hashes = None):
+    root_hash = root_hash or repo.manifest.root_catalog
+    if hashes is None:
+        hashes = hash_set.HashSet()
+    hashes.add(root_hash + "C")
+    pending = [ root_hash ]
+    visited = hash_set.HashSet()
+    while pending:
+        catalog_hash = pending.pop()
+        if not visited.add(catalog_hash):
+            continue
+        catalog_hashes = index.get_hashes_for_catalog(repo, catalog_hash)
+        hashes.update(catalog_hashes)
+        for record in catalog_hashes.records():
+            if record[-1] == "C":
+                pending.append(hash_set.decode(record)[:-1])
+    return hashes
+
+def report_progress(message):
+    print >> sys.stderr, message
 
 
 # check input values
-if len(sys.argv) != 2 and len(sys.argv) != 3:
+parser = optparse.OptionParser()
+parser.add_option("-s", "--stream", action="store_true", dest="stream",
+                  default=False,
+                  help="sort the hashes on disk to bound the memory usage")
+parser.add_option("-m", "--memory-budget", type="int", dest="memory_budget",
+                  default=512, metavar="MB",
+                  help="memory for buffering hashes in streaming mode (default: 512)")
+parser.add_option("--temp-dir", dest="temp_dir", default=None,
+                  help="directory for the sorted runs in streaming mode")
+parser.add_option("-i", "--index", dest="index", default=None, metavar="DIR",
+                  help="keep the hashes of every catalog in DIR for later runs")
+parser.add_option("-p", "--progress", action="store_true", dest="progress",
+                  default=False, help="report the progress of streaming mode")
+download_scheduler.add_rate_limit_options(parser)
+(options, args) = parser.parse_args()
+
+if len(args) != 1 and len(args) != 2:
     usage()
     sys.exit(1)
 
 # get input parameters
-repo_identifier   = sys.argv[1]
-root_catalog_hash = sys.argv[2] if len(sys.argv) == 3 else None
+repo_identifier   = args[0]
+root_catalog_hash = args[1] if len(args) == 2 else None
+
+scheduler = download_scheduler.scheduler_from_options(options)
+repo      = throttled_fetcher.open_repository(repo_identifier, scheduler)
+
+hashes = None
+if options.stream:
+    hashes = hash_set.ExternalHashSorter(options.memory_budget * 1024 * 1024,
+                                         options.temp_dir,
+                                         progress = report_progress if options.progress
+                                                                    else None)
+if options.index:
+    index  = CatalogHashIndex(options.index)
+    hashes = get_indexed_hashes_for_revision(repo, index, root_catalog_hash, hashes)
+    print >> sys.stderr, "Queried" , index.queried , "catalogs, reused" , \
+                         index.reused , "from the index"
+else:
+    hashes = get_hashes_for_revision(repo, root_catalog_hash, hashes)
 
-repo = cvmfs.open_repository(repo_identifier)
-hashes = get_hashes_for_revision(repo, root_catalog_hash)
+printed = 0
+for content_hash in hashes:
+    sys.stdout.write(content_hash + "\n")
+    printed += 1
+    if options.progress and printed % 1000000 == 0:
+        report_progress("printed %d hashes" % printed)
 
-print '\n'.join(hashes)
+if options.throughput_report:
+    scheduler.report()
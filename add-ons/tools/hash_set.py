@@ -0,0 +1,334 @@
+"""
+Compact sets of content hashes for repository-scale traversals (cf. the hash
+filters in cvmfs/garbage_collection/hash_filter.h).
+
+Hashes are given and returned as the strings the tools print, i.e. a hex
+digest with an optional algorithm ('-rmd160') and an optional suffix
+character ('C', 'P', ...).  Internally, every hash is a fixed-size record of
+the binary digest, an algorithm byte and a suffix byte, kept in a single
+open addressing table (a bytearray) instead of one Python string each.
+ExternalHashSorter bounds the memory further by sorting the records on disk.
+"""
+
+import binascii
+import heapq
+import os
+import struct
+import tempfile
+
+DIGEST_SIZE = 20
+RECORD_SIZE = DIGEST_SIZE + 2
+ALGORITHMS  = [ "", "-rmd160", "-shake128" ]
+
+_first_word = struct.Struct("<Q").unpack_from
+_words      = struct.Struct("<IIIII").unpack_from
+
+def encode(hash_string):
+    """ packs a hash string into its binary record """
+    hex_digest = hash_string[:2 * DIGEST_SIZE]
+    rest       = hash_string[2 * DIGEST_SIZE:]
+    suffix     = "\0"
+    if rest and rest[-1].isupper():
+        suffix = rest[-1]
+        rest   = rest[:-1]
+    try:
+        algorithm = ALGORITHMS.index(rest)
+        digest    = binascii.unhexlify(hex_digest)
+    except (ValueError, TypeError, binascii.Error):
+        raise ValueError("unsupported hash " + hash_string)
+    if len(digest) != DIGEST_SIZE:
+        raise ValueError("unsupported hash " + hash_string)
+    # the algorithm byte is never zero, a zero marks an empty table slot
+    return digest + chr(algorithm + 1) + suffix
+
+
+def decode(record):
+    """ unpacks a binary record into its hash string """
+    suffix = record[DIGEST_SIZE + 1]
+    return binascii.hexlify(record[:DIGEST_SIZE]) + \
+           ALGORITHMS[ord(record[DIGEST_SIZE]) - 1] + \
+           (suffix if suffix != "\0" else "")
+
+
+def _probe(table, record):
+    """ (offset, True) of the record or (offset of a free slot, False) """
+    slots    = len(table) // RECORD_SIZE
+    position = _first_word(record)[0] % slots
+    while True:
+        offset = position * RECORD_SIZE
+        if not table[offset + DIGEST_SIZE]:
+            return offset, False
+        if table[offset:offset + RECORD_SIZE] == record:
+            return offset, True
+        position = (position + 1) % slots
+
+
+class BloomFilter(object):
+    """ bit array with k probes taken from the (uniformly distributed) digest """
+    def __init__(self, bits, probes = 4):
+        self.bits   = max(8, bits)
+        self.probes = min(probes, 5)
+        self.array  = bytearray((self.bits + 7) // 8)
+
+    def add(self, record):
+        words = _words(record)
+        for i in range(self.probes):
+            bit = words[i] % self.bits
+            self.array[bit >> 3] |= 1 << (bit & 7)
+
+    def might_contain(self, record):
+        words = _words(record)
+        for i in range(self.probes):
+            bit = words[i] % self.bits
+            if not self.array[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+
+class HashSet(object):
+    """ set of content hashes stored in a linear probing table of records
+
+    Takes RECORD_SIZE bytes per slot and keeps the table 35% to 70% full, that
+    is 31 to 63 bytes per hash instead of over 100 for a set of strings.
+    With bloom_bits, lookups of absent hashes mostly end at a Bloom filter
+    (which is only rebuilt when the table grows).
+
+    Like a set, it may be read from other threads while one thread adds to
+    it: a growing table is filled completely before it replaces the old one.
+    """
+    max_load = 0.7
+
+    def __init__(self, hashes = None, capacity = 1024, bloom_bits = None):
+        slots = 16
+        while slots * self.max_load < capacity:
+            slots *= 2
+        self._table      = bytearray(slots * RECORD_SIZE)
+        self._count      = 0
+        self._bloom_bits = bloom_bits
+        self._bloom      = BloomFilter(bloom_bits) if bloom_bits else None
+        if hashes is not None:
+            self.update(hashes)
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, hash_string):
+        return self.contains_record(encode(hash_string))
+
+    def __iter__(self):
+        for record in self.records():
+            yield decode(record)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def add(self, hash_string):
+        """ adds a hash, returns False if it was in the set already """
+        return self.add_record(encode(hash_string))
+
+    def discard(self, hash_string):
+        self.discard_record(encode(hash_string))
+
+    def update(self, hashes):
+        """ merges other hashes into this set in place """
+        if isinstance(hashes, HashSet):
+            self._reserve(len(hashes))
+            for record in hashes.records():
+                self.add_record(record)
+        else:
+            for hash_string in hashes:
+                self.add(hash_string)
+
+    def records(self):
+        """ iterates over the binary records (in table order) """
+        table = self._table
+        for offset in xrange(0, len(table), RECORD_SIZE):
+            if table[offset + DIGEST_SIZE]:
+                yield str(table[offset:offset + RECORD_SIZE])
+
+    def sorted_records(self):
+        """ the binary records in sorted order (a list, costs extra memory) """
+        return sorted(self.records())
+
+    def memory_usage(self):
+        """ approximate number of bytes used by the table and Bloom filter """
+        bloom = len(self._bloom.array) if self._bloom else 0
+        return len(self._table) + bloom
+
+    def contains_record(self, record):
+        assert len(record) == RECORD_SIZE
+        if self._bloom is not None and not self._bloom.might_contain(record):
+            return False
+        return self._find(record)[1]
+
+    def add_record(self, record):
+        assert len(record) == RECORD_SIZE
+        if (self._count + 1) > self._slots() * self.max_load:
+            self._resize(self._slots() * 2)
+        offset, found = self._find(record)
+        if found:
+            return False
+        if self._bloom is not None:  # before readers can find it in the table
+            self._bloom.add(record)
+        self._table[offset:offset + RECORD_SIZE] = record
+        self._count += 1
+        return True
+
+    def discard_record(self, record):
+        """ removes a record by shifting back the rest of its probe sequence """
+        offset, found = self._find(record)
+        if not found:
+            return
+        table    = self._table
+        slots    = len(table) // RECORD_SIZE
+        hole     = offset // RECORD_SIZE
+        position = hole
+        while True:
+            position = (position + 1) % slots
+            start    = position * RECORD_SIZE
+            if not table[start + DIGEST_SIZE]:
+                break
+            home = _first_word(table, start)[0] % slots
+            # move the entry into the hole unless its home lies in (hole, position]
+            if (position > hole and (home <= hole or home > position)) or \
+               (position < hole and (home <= hole and home > position)):
+                table[hole * RECORD_SIZE:(hole + 1) * RECORD_SIZE] = \
+                    table[start:start + RECORD_SIZE]
+                hole = position
+        table[hole * RECORD_SIZE:(hole + 1) * RECORD_SIZE] = \
+            bytearray(RECORD_SIZE)
+        self._count -= 1
+        # the Bloom filter keeps the bit, it only prefilters lookups
+
+    def _slots(self):
+        return len(self._table) // RECORD_SIZE
+
+    def _find(self, record):
+        return _probe(self._table, record)
+
+    def _reserve(self, additional):
+        slots = self._slots()
+        while (self._count + additional) > slots * self.max_load:
+            slots *= 2
+        if slots != self._slots():
+            self._resize(slots)
+
+    def _resize(self, slots):
+        # readers keep using the old table (and filter) until both are swapped
+        table = bytearray(slots * RECORD_SIZE)
+        bloom = None
+        if self._bloom is not None:
+            bloom = BloomFilter(max(self._bloom_bits, 10 * slots))
+        for record in self.records():
+            offset = _probe(table, record)[0]
+            table[offset:offset + RECORD_SIZE] = record
+            if bloom is not None:
+                bloom.add(record)
+        if bloom is not None:
+            self._bloom = bloom
+        self._table = table
+
+
+
+class ExternalHashSorter(object):
+    """ collects hashes like a HashSet but within a memory budget
+
+    Hashes are buffered in a HashSet; whenever it is full, its records are
+    written sorted to a run file in temp_dir.  Iterating k-way merges the runs
+    (at most fan_in at a time, in several passes if needed) and yields every
+    hash once, in sorted order of the records.  progress is called with a
+    message for every run written and every merge pass.
+    """
+    bytes_per_entry = 128 # buffered record plus its share of the sorted list
+
+    def __init__(self, memory_budget, temp_dir = None, fan_in = 64,
+                 progress = None):
+        self.memory_budget = memory_budget
+        self.max_entries   = max(1024, memory_budget // self.bytes_per_entry)
+        self.temp_dir      = temp_dir
+        self.fan_in        = max(2, fan_in)
+        self.progress      = progress
+        self.buffer        = HashSet(capacity = self.max_entries)
+        self.runs          = []
+        self.added         = 0
+
+    def add(self, hash_string):
+        self.add_record(encode(hash_string))
+
+    def add_record(self, record):
+        if self.buffer.add_record(record):
+            self.added += 1
+            if len(self.buffer) >= self.max_entries:
+                self._spill()
+
+    def update(self, hashes):
+        if isinstance(hashes, HashSet):
+            for record in hashes.records():
+                self.add_record(record)
+        else:
+            for hash_string in hashes:
+                self.add(hash_string)
+
+    def __iter__(self):
+        for record in self.sorted_records():
+            yield decode(record)
+
+    def sorted_records(self):
+        """ merges all runs, yields the unique records and removes the runs """
+        if len(self.buffer) or not self.runs:
+            self._spill()
+        try:
+            while len(self.runs) > self.fan_in:
+                merged = self._new_run_file()
+                self._report("merging %d of %d runs" % (self.fan_in, len(self.runs)))
+                with merged:
+                    for record in self._merge(self.runs[:self.fan_in]):
+                        merged.write(record)
+                self._remove_runs(self.runs[:self.fan_in])
+                self.runs = self.runs[self.fan_in:] + [ merged.name ]
+            self._report("merging %d runs into the output" % len(self.runs))
+            for record in self._merge(self.runs):
+                yield record
+        finally:
+            self._remove_runs(self.runs)
+            self.runs = []
+
+    def _spill(self):
+        run = self._new_run_file()
+        with run:
+            for record in self.buffer.sorted_records():
+                run.write(record)
+        self.runs.append(run.name)
+        self._report("wrote run %d with %d hashes (%d collected so far)" %
+                     (len(self.runs), len(self.buffer), self.added))
+        self.buffer = HashSet(capacity = self.max_entries)
+
+    def _merge(self, runs):
+        block_size = max(RECORD_SIZE, self.memory_budget // (len(runs) + 1))
+        block_size = block_size - block_size % RECORD_SIZE
+        previous   = None
+        for record in heapq.merge(*[ self._read_run(run, block_size) for run in runs ]):
+            if record != previous:
+                yield record
+                previous = record
+
+    def _read_run(self, run, block_size):
+        with open(run, "rb") as f:
+            for block in iter(lambda: f.read(block_size), ""):
+                for offset in xrange(0, len(block), RECORD_SIZE):
+                    yield block[offset:offset + RECORD_SIZE]
+
+    def _new_run_file(self):
+        return tempfile.NamedTemporaryFile("wb", dir = self.temp_dir,
+                                           prefix = "hashes.", suffix = ".run",
+                                           delete = False)
+
+    def _remove_runs(self, runs):
+        for run in runs:
+            if os.path.exists(run):
+                os.unlink(run)
+
+    def _report(self, message):
+        if self.progress is not None:
+            self.progress(message)
@@ -0,0 +1,87 @@
+#!/usr/bin/python
+
+import cvmfs
+
+import sys
+import os
+import time
+
+class LegacyDirectoryEntry:
+	""" DirectoryEntry as it used to be: an old-style class with a __dict__ """
+
+	def __init__(self):
+		self.md5path_1 = 0
+		self.md5path_2 = 0
+		self.parent_1  = 0
+		self.parent_2  = 0
+		self.flags     = 0
+		self.size      = 0
+		self.mode      = 0
+		self.mtime     = 0
+		self.name      = ""
+		self.symlink   = ""
+
+
+def loadLegacy(catalog):
+	listing = []
+	for row in catalog.IterateSql("SELECT md5path_1, md5path_2, parent_1,       \
+	                                      parent_2, flags, size, mode, mtime,   \
+	                                      name, symlink FROM catalog;"):
+		e = LegacyDirectoryEntry()
+		e.md5path_1, e.md5path_2, e.parent_1, e.parent_2, e.flags, e.size, \
+		e.mode, e.mtime, e.name, e.symlink = row
+		listing.append(e)
+	return listing
+
+
+def loadCompact(catalog):
+	listing = []
+	for row in catalog.IterateSql("SELECT " + catalog.dirent_columns_ + \
+	                              " FROM catalog;"):
+		listing.append(cvmfs.DirectoryEntry(row))
+	return listing
+
+
+def residentBytes():
+	return int(open("/proc/self/statm").read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(catalog, loader):
+	""" Load all entries in a forked child to get an undisturbed RSS delta """
+	read_end, write_end = os.pipe()
+	pid = os.fork()
+	if pid == 0:
+		os.close(read_end)
+		before  = residentBytes()
+		start   = time.time()
+		listing = loader(catalog)
+		elapsed = time.time() - start
+		used    = residentBytes() - before
+		os.write(write_end, "%d %d %f" % (len(listing), used, elapsed))
+		os._exit(0)
+	os.close(write_end)
+	result = os.read(read_end, 128).split()
+	os.waitpid(pid, 0)
+	return int(result[0]), int(result[1]), float(result[2])
+
+
+def usage():
+	print sys.argv[0] + " <catalog path | catalog url>"
+	print "This script loads all directory entries of the given catalog once with"
+	print "the former __dict__ based DirectoryEntry and once with the compact one"
+	print "and prints the memory and time spent per entry."
+
+
+def main():
+	if len(sys.argv) != 2:
+		usage()
+		sys.exit(1)
+
+	catalog = cvmfs.OpenCatalog(sys.argv[1])
+	for label, loader in (("legacy ", loadLegacy), ("compact", loadCompact)):
+		entries, used, elapsed = measure(catalog, loader)
+		print label , ":" , entries , "entries |" , \
+		      used / max(entries, 1) , "bytes/entry |" , \
+		      "%.2f" % (elapsed * 1000000 / max(entries, 1)) , "us/entry"
+
+main()
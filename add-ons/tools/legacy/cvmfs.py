@@ -10,7 +10,21 @@ import subprocess
 import urlparse
 import datetime
 import collections
-import ctypes
+import struct
+import heapq
+import urllib
+import errno
+import fcntl
+import binascii
+import httplib
+import socket
+import threading
+import hashlib
+import re
+import random
+import time
+import Queue
+import mmap
 
 # figure out which sqlite module to use
 # in Python 2.4 an old version is present
@@ -29,13 +43,154 @@ if not foundSqlite3:
 		pass
 
 
+_MD5_HALVES = struct.Struct("<qq")
+
 def _SplitMD5(md5digest):
-	hi = lo = 0
-	for i in range(0, 8):
-		lo = lo | (ord(md5digest[i]) << (i * 8))
-	for i in range(8,16):
-		hi = hi | (ord(md5digest[i]) << ((i - 8) * 8))
-	return ctypes.c_int64(lo).value, ctypes.c_int64(hi).value  # signed int!
+	""" Little endian halves of an MD5 digest as signed (!) 64 bit integers """
+	return _MD5_HALVES.unpack(md5digest)
+
+
+def _SplitMD5Path(path):
+	return _MD5_HALVES.unpack(md5.md5(path).digest())
+
+
+# column order of the rows backing a DirectoryEntry
+_DIRENT_FIELDS    = ("md5path_1", "md5path_2", "parent_1", "parent_2", "flags",
+                     "size", "mode", "mtime", "name", "symlink",
+                     "hardlinks", "hash", "uid", "gid", "xattr")
+_DIRENT_DEFAULTS  = (0, 0, 0, 0, 0, 0, 0, 0, "", "", 0, None, 0, 0, None)
+_SCHEMA_EPSILON   = 0.0005
+
+
+def _DirentColumns(schema, schema_revision, table = ""):
+	""" SELECT list of the dirent row layout for a given catalog schema
+
+	Columns missing in older schemas are filled with constants, so that the
+	row layout stays the same (cf. SqlLookup::GetFieldsToSelect).
+	"""
+	missing = {}
+	if schema < 2.1 - _SCHEMA_EPSILON:
+		missing.update(hardlinks = "0", uid = "0", gid = "0")
+	if schema < 2.5 - _SCHEMA_EPSILON or schema_revision < 2:
+		missing.update(xattr = "NULL")
+	return ", ".join([ missing.get(field, table + field)
+	                   for field in _DIRENT_FIELDS ])
+
+
+def _DecodeXattrs(xattr_blob):
+	""" Deserialize extended attributes as done by XattrList::Deserialize """
+	xattrs = {}
+	if xattr_blob is None:
+		return xattrs
+	buf = str(xattr_blob)
+	if len(buf) < 2 or ord(buf[0]) != 1:
+		raise Exception("unsupported extended attribute serialization")
+	pos = 2
+	for i in range(0, ord(buf[1])):
+		len_key, len_value = ord(buf[pos]), ord(buf[pos + 1])
+		pos += 2
+		xattrs[buf[pos:pos + len_key]] = buf[pos + len_key:pos + len_key + len_value]
+		pos += len_key + len_value
+	return xattrs
+
+
+_OBJECT_NAME = re.compile("(?:^|/)data/([0-9a-f]{2})/([0-9a-f]+)" + \
+                          "(?:-([a-z0-9]+))?[A-Z]?$")
+_HASH_ALGORITHMS = { "sha1" : "sha1", "rmd160" : "ripemd160" }
+
+def _MakeObjectPath(content_hash, suffix = ""):
+	""" Location of a content-addressed object relative to the repository root """
+	return "data/" + content_hash[:2] + "/" + content_hash[2:] + suffix
+
+
+def _NewContentHasher(object_name):
+	""" (hasher, expected hex digest) to verify an object, (None, None) if n/a """
+	match = _OBJECT_NAME.search(object_name)
+	if match is None:
+		return None, None
+	algorithm = match.group(3) or "sha1"
+	try:
+		hasher = hashlib.new(_HASH_ALGORITHMS[algorithm])
+	except (KeyError, ValueError):
+		return None, None  # unknown algorithm or not supported by OpenSSL
+	return hasher, match.group(1) + match.group(2)
+
+
+def _TransferStream(source, object_name, raw_out = None, inflated_out = None, \
+                    block_size = 64 * 1024, max_chunk = 1024 * 1024):
+	""" Copy a compressed object block-wise, inflating and verifying it on the fly
+
+	The raw bytes are written to raw_out and/or the decompressed bytes to
+	inflated_out, at most max_chunk bytes at a time (a single block of highly
+	compressible data may inflate to much more).  If object_name is a
+	content-addressed path (data/xx/...), the content hash is checked and a
+	mismatch raises an exception.
+	"""
+	hasher, expected_digest = _NewContentHasher(object_name)
+	decompressor = None
+	if inflated_out is not None:
+		decompressor = zlib.decompressobj()
+	read = getattr(source, "ReadBuffer", source.read)  # zero-copy if mapped
+	while True:
+		block = read(block_size)
+		if not block:
+			break
+		if hasher is not None:
+			hasher.update(block)
+		if raw_out is not None:
+			raw_out.write(block)
+		# python 2 keeps data after the end of the stream in unconsumed_tail
+		while decompressor is not None and block and \
+		      not decompressor.unused_data:
+			inflated_out.write(decompressor.decompress(block, max_chunk))
+			block = decompressor.unconsumed_tail
+	if decompressor is not None:
+		inflated_out.write(decompressor.flush())
+	if hasher is not None and hasher.hexdigest() != expected_digest:
+		raise Exception("content hash mismatch for " + object_name + \
+		                " (got " + hasher.hexdigest() + ")")
+
+
+def _OpenReadOnlyDatabase(db_path):
+	""" Open an SQLite database that is never modified with query_only set
+	    (python 2's sqlite3 cannot open URIs, so immutable=1 is out of reach) """
+	if not os.path.exists(db_path):  # connect() would create an empty one
+		raise sqlite.OperationalError("unable to open database file")
+	db_handle = sqlite.connect(db_path, check_same_thread = False)
+	try:
+		db_handle.execute("PRAGMA query_only = ON;")
+	except sqlite.OperationalError:
+		pass  # SQLite < 3.8.0
+	return db_handle
+
+
+def _MakeDirectory(directory):
+	""" Create a (cache) directory unless it was created concurrently """
+	if os.path.isdir(directory):
+		return
+	try:
+		os.makedirs(directory, 0700)
+	except OSError:
+		if not os.path.isdir(directory):
+			raise
+
+
+def DefaultCacheDirectory():
+	""" Location of the persistent cache, can be overridden by CVMFS_PY_CACHE """
+	default_path = os.path.join(tempfile.gettempdir(), \
+	                            "cvmfs-py-cache-" + str(os.getuid()))
+	return os.environ.get("CVMFS_PY_CACHE", default_path)
+
+
+def DefaultCacheQuota():
+	""" Cache size limit in bytes, can be overridden by CVMFS_PY_CACHE_QUOTA (MB) """
+	return int(os.environ.get("CVMFS_PY_CACHE_QUOTA", "4000")) * 1024 * 1024
+
+
+def DefaultTimeout():
+	""" Network timeout in seconds (cf. CVMFS_TIMEOUT_DIRECT), can be
+	    overridden by CVMFS_PY_TIMEOUT """
+	return float(os.environ.get("CVMFS_PY_TIMEOUT", "10"))
 
 
 
@@ -98,6 +253,428 @@ class Manifest:
 
 
 
+class QuotaManager:
+	""" LRU bookkeeping and size limit of a cache directory (cf. cvmfs/quota.cc)
+
+	Every cached file is registered with its size and an access sequence number
+	in a small SQLite database.  If an insertion would exceed the limit, least
+	recently used files are evicted until the cache shrinks to the cleanup
+	threshold.  Processes sharing the cache serialize on a flock()ed lock file.
+	"""
+
+	def __init__(self, cache_directory, limit, cleanup_threshold = None):
+		if cleanup_threshold is None:
+			cleanup_threshold = limit / 2
+		if limit > 0 and cleanup_threshold >= limit:
+			raise Exception("cleanup threshold must be smaller than the limit")
+		_MakeDirectory(cache_directory)
+		self.cache_directory_   = cache_directory
+		self.limit_             = limit
+		self.cleanup_threshold_ = cleanup_threshold
+		self.thread_lock_       = threading.RLock()
+		self.lock_file_         = open(os.path.join(cache_directory, "lock"), "a")
+		self.db_handle_         = sqlite.connect( \
+		                            os.path.join(cache_directory, "quota.db"), \
+		                            timeout = 60, check_same_thread = False)
+		self.db_handle_.text_factory = str
+		self._Lock()
+		try:
+			self.db_handle_.execute("CREATE TABLE IF NOT EXISTS cache_catalog        \
+			                           (path TEXT, size INTEGER, acseq INTEGER,      \
+			                            CONSTRAINT pk_cache_catalog PRIMARY KEY (path));")
+			self.db_handle_.execute("CREATE INDEX IF NOT EXISTS idx_cache_catalog_acseq \
+			                           ON cache_catalog (acseq);")
+			self.db_handle_.commit()
+		finally:
+			self._Unlock()
+
+
+	def __del__(self):
+		if hasattr(self, 'db_handle_'):
+			self.db_handle_.close()
+		if hasattr(self, 'lock_file_'):
+			self.lock_file_.close()
+
+
+	def __str__(self):
+		return "<QuotaManager for " + self.cache_directory_ + ">"
+
+
+	def __repr__(self):
+		return self.__str__()
+
+
+	def GetMaxFileSize(self):
+		""" Largest file that can be inserted (cf. QuotaManager::GetMaxFileSize) """
+		if self.limit_ <= 0:
+			return sys.maxint
+		return self.limit_ - self.cleanup_threshold_
+
+
+	def GetSize(self):
+		""" Number of bytes currently occupied by registered files """
+		self._Lock()
+		try:
+			return self._GetSize()
+		finally:
+			self._Unlock()
+
+
+	def Touch(self, path):
+		""" Mark a cached file as most recently used, False if it is gone """
+		full_path = os.path.join(self.cache_directory_, path)
+		self._Lock()
+		try:
+			if not os.path.exists(full_path):
+				self.db_handle_.execute("DELETE FROM cache_catalog WHERE path = ?;", \
+				                        (path,))
+				self.db_handle_.commit()
+				return False
+			cursor = self.db_handle_.execute("UPDATE cache_catalog SET acseq = ? \
+			                                  WHERE path = ?;",                \
+			                                 (self._NextSequence(), path))
+			if cursor.rowcount == 0:  # file from an older, untracked cache
+				self._Register(path, os.path.getsize(full_path))
+			self.db_handle_.commit()
+			return True
+		finally:
+			self._Unlock()
+
+
+	def Insert(self, path, tmp_path):
+		""" Move a finished file into the cache, False if it is too large """
+		size = os.path.getsize(tmp_path)
+		if size > self.GetMaxFileSize():
+			os.unlink(tmp_path)
+			return False
+		full_path = os.path.join(self.cache_directory_, path)
+		self._Lock()
+		try:
+			if self.limit_ > 0 and self._GetSize() + size > self.limit_:
+				self._Cleanup(self.cleanup_threshold_)
+			_MakeDirectory(os.path.dirname(full_path))
+			os.rename(tmp_path, full_path)
+			self._Register(path, size)
+			self.db_handle_.commit()
+			return True
+		finally:
+			self._Unlock()
+
+
+	def Cleanup(self, leave_size):
+		""" Evict least recently used files until at most leave_size bytes remain """
+		self._Lock()
+		try:
+			self._Cleanup(leave_size)
+		finally:
+			self._Unlock()
+
+
+	def _Cleanup(self, leave_size):
+		gauge  = self._GetSize()
+		cursor = self.db_handle_.execute("SELECT path, size FROM cache_catalog \
+		                                  ORDER BY acseq ASC;")
+		evicted = []
+		for path, size in cursor:
+			if gauge <= leave_size:
+				break
+			try:
+				os.unlink(os.path.join(self.cache_directory_, path))
+			except OSError, e:
+				if e.errno != errno.ENOENT:
+					raise
+			evicted.append((path,))
+			gauge -= size
+		self.db_handle_.executemany("DELETE FROM cache_catalog WHERE path = ?;", \
+		                            evicted)
+		self.db_handle_.commit()
+
+
+	def _GetSize(self):
+		return self.db_handle_.execute("SELECT coalesce(sum(size), 0) \
+		                                FROM cache_catalog;").fetchone()[0]
+
+
+	def _NextSequence(self):
+		return self.db_handle_.execute("SELECT coalesce(max(acseq), 0) + 1 \
+		                                FROM cache_catalog;").fetchone()[0]
+
+
+	def _Register(self, path, size):
+		self.db_handle_.execute("INSERT OR REPLACE INTO cache_catalog \
+		                         (path, size, acseq) VALUES (?, ?, ?);", \
+		                        (path, size, self._NextSequence()))
+
+
+	def _Lock(self):
+		# flock() only excludes other processes, threads need their own lock
+		self.thread_lock_.acquire()
+		fcntl.flock(self.lock_file_.fileno(), fcntl.LOCK_EX)
+
+
+	def _Unlock(self):
+		fcntl.flock(self.lock_file_.fileno(), fcntl.LOCK_UN)
+		self.thread_lock_.release()
+
+
+
+class CatalogCacheMiss(Exception):
+	""" A catalog expected in the CatalogCache is not (or no longer) there """
+
+
+
+class CatalogCache:
+	""" Persistent on-disk store of decompressed catalogs keyed by content hash """
+
+	def __init__(self, quota_manager):
+		self.quota_manager_   = quota_manager
+		self.cache_directory_ = os.path.join(quota_manager.cache_directory_, \
+		                                     "catalogs")
+		_MakeDirectory(self.cache_directory_)
+
+
+	def __str__(self):
+		return "<CatalogCache at " + self.cache_directory_ + ">"
+
+
+	def __repr__(self):
+		return self.__str__()
+
+
+	def Contains(self, catalog_hash):
+		""" Checks if a decompressed copy of the given catalog is available """
+		return self.quota_manager_.Touch(self._GetRelativePath(catalog_hash))
+
+
+	def Exists(self, catalog_hash):
+		""" Checks for a decompressed copy without marking it as used (no write
+		    to the quota database, but it might be evicted right afterwards) """
+		return os.path.exists(self.GetPath(catalog_hash))
+
+
+	def GetPath(self, catalog_hash):
+		""" Location of the decompressed catalog (might not exist yet) """
+		return os.path.join(self.quota_manager_.cache_directory_, \
+		                    self._GetRelativePath(catalog_hash))
+
+
+	def Lookup(self, catalog_hash):
+		""" Path of the decompressed catalog, None if it is not cached
+
+		Checks and touches in one step, a separate Contains() check followed by
+		GetPath() could race with another process evicting the catalog.
+		"""
+		if not self.Contains(catalog_hash):
+			return None
+		return self.GetPath(catalog_hash)
+
+
+	def Insert(self, catalog_hash, catalog_file):
+		""" Inflate a catalog into the cache, returns its path (None if too large) """
+		catalog_path = self.Lookup(catalog_hash)
+		if catalog_path is not None:
+			return catalog_path
+		tmp_file = self.NewTemporaryFile()
+		try:
+			_TransferStream(catalog_file, _MakeObjectPath(catalog_hash, "C"), \
+			                inflated_out = tmp_file)
+		except:
+			tmp_file.close()
+			os.unlink(tmp_file.name)
+			raise
+		return self.Commit(catalog_hash, tmp_file)
+
+
+	def NewTemporaryFile(self):
+		""" Scratch file to inflate into, to be handed to Commit() afterwards """
+		# inflate next to the cache and move it into place atomically, so that
+		# concurrent readers never see a partially written catalog
+		return tempfile.NamedTemporaryFile('w+b', dir = self.cache_directory_, \
+		                                   prefix = "inflate.", delete = False)
+
+
+	def Commit(self, catalog_hash, tmp_file):
+		""" Move an inflated catalog into place, returns its path (or None) """
+		tmp_file.close()
+		os.chmod(tmp_file.name, 0444)
+		if not self.quota_manager_.Insert(self._GetRelativePath(catalog_hash), \
+		                                  tmp_file.name):
+			return None
+		return self.GetPath(catalog_hash)
+
+
+	def _GetRelativePath(self, catalog_hash):
+		return os.path.join("catalogs", catalog_hash[:2], catalog_hash[2:])
+
+
+
+class ObjectCache:
+	""" Persistent on-disk store of content-addressed objects from data/ """
+
+	def __init__(self, quota_manager):
+		self.quota_manager_   = quota_manager
+		self.cache_directory_ = os.path.join(quota_manager.cache_directory_, \
+		                                     "objects")
+		_MakeDirectory(self.cache_directory_)
+
+
+	def __str__(self):
+		return "<ObjectCache at " + self.cache_directory_ + ">"
+
+
+	def __repr__(self):
+		return self.__str__()
+
+
+	@staticmethod
+	def IsCacheable(file_name):
+		""" Only content-addressed objects are immutable and thus cacheable """
+		return file_name.startswith("data/")
+
+
+	def Contains(self, file_name):
+		""" Checks if the given object is cached """
+		return self.quota_manager_.Touch(self._GetRelativePath(file_name))
+
+
+	def Open(self, file_name):
+		""" Open a cached object for reading, None on a cache miss """
+		if not self.quota_manager_.Touch(self._GetRelativePath(file_name)):
+			return None
+		try:
+			return open(self._GetPath(file_name), "rb")
+		except IOError, e:
+			if e.errno != errno.ENOENT:
+				raise
+			return None  # evicted in the meantime
+
+
+	def NewTemporaryFile(self):
+		""" Scratch file to download into, to be handed to Insert() afterwards """
+		return tempfile.NamedTemporaryFile('w+b', dir = self.cache_directory_, \
+		                                   prefix = "fetch.", delete = False)
+
+
+	def Insert(self, file_name, tmp_file):
+		""" Commit a downloaded temporary file and return it opened for reading """
+		tmp_file.flush()
+		tmp_file.seek(0)
+		result = open(tmp_file.name, "rb")
+		tmp_file.close()
+		# the read handle stays valid even if the file gets evicted or rejected
+		self.quota_manager_.Insert(self._GetRelativePath(file_name), tmp_file.name)
+		return result
+
+
+	def _GetPath(self, file_name):
+		return os.path.join(self.quota_manager_.cache_directory_, \
+		                    self._GetRelativePath(file_name))
+
+
+	def _GetRelativePath(self, file_name):
+		return os.path.join("objects", file_name)
+
+
+
+class ClientCache:
+	""" Read-only view on the cache directory of a cvmfs client (cf. cvmfs/cache.cc)
+
+	cache_directory is the directory the client actually uses, i.e.
+	$CVMFS_CACHE_BASE/shared or $CVMFS_CACHE_BASE/<fqrn>.  The client keeps
+	objects inflated under xx/rest[-algorithm] without the hash suffix.  They
+	are verified by compressing them again (zlib default level, as the
+	client does) and checking the content hash; objects that do not match,
+	e.g. because of a different zlib version, count as rejected.
+	"""
+
+	def __init__(self, cache_directory):
+		if not os.path.isdir(cache_directory):
+			raise Exception("didn't find " + cache_directory)
+		self.cache_directory_ = cache_directory
+		self.lock_            = threading.Lock()
+		self.hits_            = 0
+		self.misses_          = 0
+		self.rejected_        = 0
+
+
+	def __str__(self):
+		return "<ClientCache at " + self.cache_directory_ + " - " + \
+		       str(self.hits_) + " hits, " + str(self.misses_) + " misses, " + \
+		       str(self.rejected_) + " rejected>"
+
+
+	def __repr__(self):
+		return self.__str__()
+
+
+	def GetStatistics(self):
+		""" Dictionary of hits, misses, rejected objects and the hit ratio """
+		lookups = self.hits_ + self.misses_ + self.rejected_
+		return { "hits"      : self.hits_,
+		         "misses"    : self.misses_,
+		         "rejected"  : self.rejected_,
+		         "hit_ratio" : float(self.hits_) / lookups if lookups else 0.0 }
+
+
+	def Fetch(self, object_name, raw_out = None, inflated_out = None, \
+	          block_size = 64 * 1024):
+		""" Copy a verified object out of the client cache, False if unusable
+
+		The recompressed object goes to raw_out and the cached (inflated) data
+		to inflated_out.  On False, both may have been partially written.
+		"""
+		hasher, expected_digest = _NewContentHasher(object_name)
+		if hasher is None:
+			return False
+		try:
+			source = open(self._GetPath(object_name), "rb")
+		except IOError, e:
+			if e.errno != errno.ENOENT:
+				raise
+			self._Count("misses_")
+			return False
+		compressor = zlib.compressobj()
+		try:
+			while True:
+				block = source.read(block_size)
+				if not block:
+					break
+				if inflated_out is not None:
+					inflated_out.write(block)
+				self._Emit(compressor.compress(block), hasher, raw_out)
+			self._Emit(compressor.flush(), hasher, raw_out)
+		finally:
+			source.close()
+		if hasher.hexdigest() != expected_digest:
+			self._Count("rejected_")
+			return False
+		self._Count("hits_")
+		return True
+
+
+	def _GetPath(self, object_name):
+		match = _OBJECT_NAME.search(object_name)
+		algorithm = ""
+		if match.group(3) is not None:
+			algorithm = "-" + match.group(3)
+		return os.path.join(self.cache_directory_, match.group(1), \
+		                    match.group(2) + algorithm)
+
+
+	@staticmethod
+	def _Emit(data, hasher, raw_out):
+		hasher.update(data)
+		if raw_out is not None:
+			raw_out.write(data)
+
+
+	def _Count(self, counter):
+		self.lock_.acquire()
+		setattr(self, counter, getattr(self, counter) + 1)
+		self.lock_.release()
+
+
+
 class CatalogReference:
 	""" Wraps a catalog reference to nested catalogs as found in Catalogs """
 
@@ -114,20 +691,99 @@ class CatalogReference:
 
 
 
-class DirectoryEntry:
-	""" Thin wrapper around a DirectoryEntry as it is saved in the Catalogs """
+def _RowField(index):
+	""" Property reading (and replacing) a single column of DirectoryEntry.row_ """
+	def getter(self):
+		return self.row_[index]
+	def setter(self, value):
+		self.row_ = self.row_[:index] + (value,) + self.row_[index + 1:]
+	return property(getter, setter)
+
 
-	def __init__(self):
-		self.md5path_1 = 0
-		self.md5path_2 = 0
-		self.parent_1  = 0
-		self.parent_2  = 0
-		self.flags     = 0
-		self.size      = 0
-		self.mode      = 0
-		self.mtime     = 0
-		self.name      = ""
-		self.symlink   = ""
+
+class NestedCatalogTrie:
+	""" Path component trie of nested catalog mountpoints for prefix lookups """
+
+	def __init__(self, catalog_references):
+		self.root_ = ({}, None)  # (children by path component, reference)
+		for reference in catalog_references:
+			self._Insert(reference)
+
+
+	def FindLongestPrefix(self, path):
+		""" Deepest CatalogReference whose mountpoint contains path (or None) """
+		node       = self.root_
+		best_match = None
+		for component in NestedCatalogTrie._Components(path):
+			node = node[0].get(component)
+			if node is None:
+				break
+			if node[1] is not None:
+				best_match = node[1]
+		return best_match
+
+
+	def _Insert(self, reference):
+		node   = self.root_
+		parent = None
+		for component in NestedCatalogTrie._Components(reference.root_path):
+			parent = node
+			node   = parent[0].setdefault(component, ({}, None))
+		if parent is not None:
+			parent[0][component] = (node[0], reference)
+
+
+	@staticmethod
+	def _Components(path):
+		return [ component for component in path.split("/") if component ]
+
+
+
+class DirectoryEntry(object):
+	""" Thin wrapper around a DirectoryEntry as it is saved in the Catalogs
+
+	Only holds a reference to the raw database row (see _DIRENT_FIELDS) and
+	decodes the rarely used columns (hash, hardlinks, xattr) on access.
+	"""
+	__slots__ = ("row_",)
+
+	def __init__(self, row = _DIRENT_DEFAULTS):
+		self.row_ = row
+
+	md5path_1 = _RowField(0)
+	md5path_2 = _RowField(1)
+	parent_1  = _RowField(2)
+	parent_2  = _RowField(3)
+	flags     = _RowField(4)
+	size      = _RowField(5)
+	mode      = _RowField(6)
+	mtime     = _RowField(7)
+	name      = _RowField(8)
+	symlink   = _RowField(9)
+	hardlinks = _RowField(10)
+	uid       = _RowField(12)
+	gid       = _RowField(13)
+
+	@property
+	def hash(self):
+		""" Hex representation of the content hash (None for directories) """
+		content_hash = self.row_[11]
+		if content_hash is None:
+			return None
+		return binascii.hexlify(content_hash)
+
+	@property
+	def linkcount(self):
+		return self.hardlinks & 0xFFFFFFFF
+
+	@property
+	def hardlink_group(self):
+		return self.hardlinks >> 32
+
+	@property
+	def xattr(self):
+		""" Dictionary of extended attributes """
+		return _DecodeXattrs(self.row_[14])
 
 	def __str__(self):
 		return "<DirectoryEntry for '" + self.name + "'>"
@@ -141,22 +797,9 @@ class DirectoryEntry:
 		return (self.flags & 1) > 0
 
 
-	def BacktracePath(self, containing_catalog, repo):
+	def BacktracePath(self, containing_catalog, repo = None):
 		""" Tries to reconstruct the full path of a DirectoryEntry """
-		dirent  = self
-		path    = self.name
-		catalog = containing_catalog
-		while True:
-			p_dirent = catalog.FindDirectoryEntrySplitMd5(dirent.parent_1, \
-				                                            dirent.parent_2)
-			if p_dirent != None:
-				path = p_dirent.name + "/" + path
-				dirent = p_dirent
-			elif not catalog.IsRoot():
-				catalog = repo.FindParentCatalogOf(catalog)
-			else:
-				break
-		return path
+		return containing_catalog.BacktracePath(self)
 
 
 
@@ -205,20 +848,92 @@ class CatalogIterator:
 
 
 
+class CatalogScanIterator:
+	""" Iterates through all directory entries of a Catalog in a single sweep
+
+	Yields the same (path, DirectoryEntry) tuples in the same breadth-first
+	order as CatalogIterator.  Instead of one query per directory, it reads all
+	directories in one table scan, reconstructs their paths in memory and then
+	resolves all directory listings in a single batched join.  Memory usage is
+	thus bounded by the number of directories rather than of entries.
+	"""
+
+	def __init__(self, catalog):
+		self.catalog = catalog
+		root_path = ""
+		if not self.catalog.IsRoot():
+			root_path = self.catalog.root_prefix
+		self.results_ = self._Scan(root_path)
+
+
+	def __iter__(self):
+		return self
+
+
+	def next(self):
+		return self.results_.next()
+
+
+	def _Scan(self, root_path):
+		root_dirent = self.catalog.FindDirectoryEntry(root_path)
+		yield root_path, root_dirent
+		if not root_dirent.IsDirectory():
+			return
+
+		# directory tree from one sweep: parent key -> [(name, key)]
+		subdirectories = collections.defaultdict(list)
+		for key, (parent_key, name) in \
+		    self.catalog.GetDirectoryIndex().iteritems():
+			subdirectories[parent_key].append((name, key))
+
+		# breadth-first numbering of the directories (sorted like ListDirectory)
+		root_key  = (root_dirent.md5path_1, root_dirent.md5path_2)
+		dir_keys  = [ root_key ]
+		dir_paths = [ root_path ]
+		i = 0
+		while i < len(dir_keys):
+			children = subdirectories.pop(dir_keys[i], [])
+			children.sort()
+			for name, key in children:
+				dir_keys.append(key)
+				dir_paths.append(dir_paths[i] + "/" + name)
+			i += 1
+		subdirectories.clear()
+
+		for idx, dirent in self.catalog.ListDirectoriesSplitMD5(dir_keys):
+			yield dir_paths[idx] + "/" + dirent.name, dirent
+
+
+
 class Catalog:
 	""" Wraps the basic functionality of CernVM-FS Catalogs """
 
-	def __init__(self, catalog_file):
-		self._Decompress(catalog_file)
-		self._OpenDatabase()
-		self._ReadProperties()
+	def __init__(self, catalog_file, catalog_hash = None, catalog_cache = None):
+		self.hash = catalog_hash
+		self.directory_index_   = None
+		self.nested_references_ = None
+		self.nested_trie_       = None
+		self.statistics_        = None
+		self._Decompress(catalog_file, catalog_cache)
+		try:
+			self._OpenDatabase()
+			self._ReadProperties()
+		except sqlite.OperationalError:
+			if catalog_file is None and not os.path.exists(self.catalog_path_):
+				raise CatalogCacheMiss(self.hash)  # evicted right after the lookup
+			raise
 		self._GuessRootPrefixIfNeeded()
 		self._CheckValidity()
+		self.dirent_columns_   = _DirentColumns(self.schema, self.schema_revision)
+		self.dirent_columns_c_ = _DirentColumns(self.schema, self.schema_revision,
+		                                        "catalog.")
 
 
 	def __del__(self):
-		self.db_handle_.close()
-		self.catalog_file_.close()
+		if hasattr(self, 'db_handle_'):
+			self.db_handle_.close()
+		if getattr(self, 'catalog_file_', None) is not None:
+			self.catalog_file_.close()
 
 
 	def __str__(self):
@@ -233,13 +948,42 @@ class Catalog:
 		return CatalogIterator(self)
 
 
+	def Scan(self):
+		""" Iterate through all entries like __iter__ but with two queries only """
+		return CatalogScanIterator(self)
+
+
 	def OpenInteractive(self):
 		""" Spawns a sqlite shell for interactive catalog database inspection """
-		subprocess.call(['sqlite3', self.catalog_file_.name])
+		subprocess.call(['sqlite3', self.catalog_path_])
 
 
 	def ListNested(self):
 		""" List CatalogReferences to all contained nested catalogs """
+		if self.nested_references_ is None:
+			self.nested_references_ = self._ReadNested()
+		return list(self.nested_references_)
+
+
+	def FindNestedForPath(self, needle_path):
+		""" Find the best matching nested CatalogReference for a given path """
+		if self.nested_trie_ is None:
+			self.nested_trie_ = NestedCatalogTrie(self.ListNested())
+		return self.nested_trie_.FindLongestPrefix(needle_path)
+
+
+	def Statistics(self):
+		""" Counters of the statistics table (self_* and subtree_*) as dictionary """
+		if self.statistics_ is None:
+			try:
+				counters = self.RunSql("SELECT counter, value FROM statistics;")
+			except sqlite.OperationalError:
+				counters = []  # catalog schema predates the statistics table
+			self.statistics_ = dict(counters)
+		return dict(self.statistics_)
+
+
+	def _ReadNested(self):
 		new_version = (self.schema <= 1.2 and self.schema_revision > 0)
 		if new_version:
 			sql_query = "SELECT path, sha1, size FROM nested_catalogs;"
@@ -252,40 +996,41 @@ class Catalog:
 			return [ CatalogReference(clg[0], clg[1]) for clg in catalogs ]
 
 
-	def FindNestedForPath(self, needle_path):
-		""" Find the best matching nested CatalogReference for a given path """
-		nested_catalogs  = self.ListNested()
-		best_match       = None
-		best_match_score = 0
-		for nested_catalog in nested_catalogs:
-			if needle_path.startswith(nested_catalog.root_path) and \
-				len(nested_catalog.root_path) > best_match_score:
-					best_match_score = len(nested_catalog.root_path)
-					best_match       = nested_catalog
-		return best_match
-
-
 	def ListDirectory(self, path):
 		""" Create a directory listing of the given directory path """
-		parent_1, parent_2 = _SplitMD5(md5.md5(path).digest())
+		parent_1, parent_2 = _SplitMD5Path(path)
 		return self.ListDirectorySplitMD5(parent_1, parent_2)
 
 
 	def ListDirectorySplitMD5(self, parent_1, parent_2):
 		""" Create a directory listing of DirectoryEntry items based on MD5 path """
-		res = self.RunSql("SELECT md5path_1, md5path_2, parent_1, parent_2,     \
-			                        flags, size, mode, mtime, name, symlink       \
-			                 FROM catalog                                         \
-			                 WHERE parent_1 = " + str(parent_1) + " AND           \
-			                       parent_2 = " + str(parent_2) + "               \
-			                 ORDER BY name ASC;")
-		listing = []
+		res = self.IterateSql("SELECT " + self.dirent_columns_ + "              \
+		                       FROM catalog                                     \
+		                       WHERE parent_1 = ? AND parent_2 = ?              \
+		                       ORDER BY name ASC;", (parent_1, parent_2))
 		for result in res:
-			e = DirectoryEntry()
-			e.md5path_1, e.md5path_2,	e.parent_1, e.parent_2, e.flags, e.size,  \
-			e.mode, e.mtime, e.name, e.symlink = result
-			listing.append(e)
-		return listing
+			yield DirectoryEntry(result)
+
+
+	def ListDirectories(self, parents):
+		""" Stream (parent path, DirectoryEntry) for many directories at once """
+		parents = list(parents)
+		keys    = [ _SplitMD5Path(parent) for parent in parents ]
+		for idx, dirent in self.ListDirectoriesSplitMD5(keys):
+			yield parents[idx], dirent
+
+
+	def ListDirectoriesSplitMD5(self, keys):
+		""" Stream (key index, DirectoryEntry) for a list of split MD5 parents """
+		res = self._QueryLookupKeys(keys, "SELECT lookup_keys.idx, " + self.dirent_columns_c_ + " \
+		                                   FROM temp.lookup_keys                          \
+		                                   JOIN catalog                                   \
+		                                     ON catalog.parent_1 = lookup_keys.md5path_1  \
+		                                    AND catalog.parent_2 = lookup_keys.md5path_2  \
+		                                   WHERE lookup_keys.batch = ?                    \
+		                                   ORDER BY lookup_keys.idx, catalog.name;")
+		for result in res:
+			yield result[0], DirectoryEntry(result[1:])
 
 
 	def FindDirectoryEntry(self, path):
@@ -302,27 +1047,49 @@ class Catalog:
 
 	def FindDirectoryEntrySplitMD5(self, md5path_1, md5path_2):
 		""" Finds the DirectoryEntry for the given split MD5 hashed path """
-		res = self.RunSql("SELECT parent_1, parent_2, flags, size, mode, mtime, \
-			                        name, symlink                                 \
-			                 FROM catalog                                         \
-			                 WHERE md5path_1 = " + str(md5path_1) + " AND         \
-			                       md5path_2 = " + str(md5path_2) + "             \
-			                 LIMIT 1;")
-		if len(res) != 1:
+		res = self.IterateSql("SELECT " + self.dirent_columns_ + "              \
+		                       FROM catalog                                     \
+		                       WHERE md5path_1 = ? AND md5path_2 = ?            \
+		                       LIMIT 1;", (md5path_1, md5path_2)).fetchone()
+		if res is None:
 			return None
-		e = DirectoryEntry()
-		e.md5path_1 = md5path_1
-		e.md5path_2 = md5path_2
-		e.parent_1, e.parent_2, e.flags, e.size, e.mode, \
-		e.mtime, e.name, e.symlink = res[0]
-		return e
+		return DirectoryEntry(res)
+
+
+	def FindDirectoryEntries(self, paths):
+		""" Stream (path, DirectoryEntry or None) for many paths in input order """
+		paths = list(paths)
+		keys  = [ _SplitMD5Path(path) for path in paths ]
+		for idx, dirent in self.FindDirectoryEntriesSplitMD5(keys):
+			yield paths[idx], dirent
+
+
+	def FindDirectoryEntriesSplitMD5(self, keys):
+		""" Stream (key index, DirectoryEntry or None) for split MD5 hashed paths """
+		res = self._QueryLookupKeys(keys, "SELECT lookup_keys.idx, " + self.dirent_columns_c_ + " \
+		                                   FROM temp.lookup_keys                          \
+		                                   LEFT JOIN catalog                              \
+		                                     ON catalog.md5path_1 = lookup_keys.md5path_1 \
+		                                    AND catalog.md5path_2 = lookup_keys.md5path_2 \
+		                                   WHERE lookup_keys.batch = ?                    \
+		                                   ORDER BY lookup_keys.idx;")
+		for result in res:
+			if result[1] is None:
+				yield result[0], None
+			else:
+				yield result[0], DirectoryEntry(result[1:])
 
 
-	def RunSql(self, sql):
+	def RunSql(self, sql, parameters = ()):
 		""" Run an arbitrary SQL query on the catalog database """
+		return self.IterateSql(sql, parameters).fetchall()
+
+
+	def IterateSql(self, sql, parameters = ()):
+		""" Run an SQL query and return a cursor to stream through the results """
 		cursor = self.db_handle_.cursor()
-		cursor.execute(sql)
-		return cursor.fetchall()
+		cursor.execute(sql, parameters)
+		return cursor
 
 
 	def IsRoot(self):
@@ -330,17 +1097,160 @@ class Catalog:
 		return self.root_prefix == "/"
 
 
-	def _Decompress(self, catalog_file):
-		""" Unzip a catalog file to a temporary referenced by self.catalog_file_ """
+	def EstimateMemoryUsage(self):
+		""" Upper bound of the memory an open handle to this catalog can occupy """
+		page_size  = self.RunSql("PRAGMA page_size;")[0][0]
+		cache_size = self.RunSql("PRAGMA cache_size;")[0][0]
+		if cache_size < 0:
+			page_cache = -cache_size * 1024
+		else:
+			page_cache = cache_size * page_size
+		page_cache = min(page_cache, os.path.getsize(self.catalog_path_))
+		index_size = 0
+		if self.directory_index_ is not None:
+			# three tuples, four integers and the name per directory
+			index_size = sys.getsizeof(self.directory_index_) + \
+			             len(self.directory_index_) * 320
+		return page_cache + index_size
+
+
+	def GetDirectoryIndex(self):
+		""" Map of all directories: (md5path_1, md5path_2) -> (parent key, name) """
+		if self.directory_index_ is None:
+			index = {}
+			for row in self.IterateSql("SELECT md5path_1, md5path_2,             \
+			                                   parent_1, parent_2, name          \
+			                            FROM catalog WHERE flags & 1;"):
+				index[(row[0], row[1])] = ((row[2], row[3]), row[4])
+			self.directory_index_ = index
+		return self.directory_index_
+
+
+	def GetRootPath(self):
+		""" Path of the root directory entry ("" for the repository root) """
+		if self.IsRoot():
+			return ""
+		return self.root_prefix
+
+
+	def BacktracePath(self, dirent, known_paths = None):
+		""" Reconstruct the full path of a DirectoryEntry stored in this Catalog
+
+		Uses the directory index only, so neither SQL queries nor parent catalogs
+		are needed.  Directory paths resolved on the way are remembered in (and
+		taken from) the optional known_paths dictionary.
+		"""
+		if known_paths is None:
+			known_paths = {}
+		root_path = self.GetRootPath()
+		root_key  = _SplitMD5Path(root_path)
+		if (dirent.md5path_1, dirent.md5path_2) == root_key:
+			return root_path
+		known_paths[root_key] = root_path
+		index  = self.GetDirectoryIndex()
+		key    = (dirent.parent_1, dirent.parent_2)
+		climbs = []
+		while key not in known_paths:
+			if key not in index:
+				raise Exception("dangling parent reference of " + str(dirent) + \
+				                " in " + str(self))
+			parent_key, name = index[key]
+			climbs.append((key, name))
+			key = parent_key
+		path = known_paths[key]
+		for key, name in reversed(climbs):
+			path = path + "/" + name
+			known_paths[key] = path
+		return path + "/" + dirent.name
+
+
+	def _Decompress(self, catalog_file, catalog_cache):
+		""" Unzip a catalog file into the catalog cache or to a temporary file """
+		if isinstance(catalog_file, MappedFile) and catalog_file.IsSQLite():
+			self.catalog_file_ = None  # already inflated, open it in place
+			self.catalog_path_ = catalog_file.name
+			return
+		if catalog_file is None:  # expected in the catalog cache
+			self.catalog_file_ = None
+			self.catalog_path_ = None
+			if catalog_cache is not None and self.hash is not None:
+				self.catalog_path_ = catalog_cache.Lookup(self.hash)
+			if self.catalog_path_ is None:
+				raise CatalogCacheMiss(self.hash)
+			return
+		if catalog_cache is not None and self.hash is not None:
+			self.catalog_file_ = None
+			self.catalog_path_ = catalog_cache.Insert(self.hash, catalog_file)
+			if self.catalog_path_ is not None:
+				return
+			catalog_file.seek(0)  # exceeds the cache quota
 		self.catalog_file_ = tempfile.NamedTemporaryFile('w+b')
-		self.catalog_file_.write(zlib.decompress(catalog_file.read()))
+		object_name = ""
+		if self.hash is not None:
+			object_name = _MakeObjectPath(self.hash, "C")
+		_TransferStream(catalog_file, object_name, inflated_out = self.catalog_file_)
 		self.catalog_file_.flush()
+		self.catalog_path_ = self.catalog_file_.name
 
 
 	def _OpenDatabase(self):
-		""" Create and configure a database handle to the Catalog """
-		self.db_handle_ = sqlite.connect(self.catalog_file_.name)
+		""" Create and configure a read-only database handle to the Catalog """
+		self.db_handle_ = _OpenReadOnlyDatabase(self.catalog_path_)
 		self.db_handle_.text_factory = str
+		self.lookup_batches_ = 0
+		self.scratch_lock_   = threading.Lock()
+
+
+	def _QueryLookupKeys(self, keys, sql):
+		""" Rows of sql (with the batch as parameter) joined with the given keys
+
+		Threads share Catalog objects (and so the database handle), but the
+		scratch table is written with query_only switched off for the whole
+		connection.  Hence loading the keys, querying and dropping them again
+		happens under a lock, and the rows are fetched before it is released.
+		"""
+		self.scratch_lock_.acquire()
+		try:
+			batch = self._LoadLookupKeys(keys)
+			try:
+				return self.IterateSql(sql, (batch,)).fetchall()
+			finally:
+				self._DropLookupKeys(batch)
+		finally:
+			self.scratch_lock_.release()
+
+
+	def _LoadLookupKeys(self, keys):
+		""" Store split MD5 keys in a temporary table to join the catalog with """
+		self.lookup_batches_ += 1
+		batch = self.lookup_batches_
+		rows  = ( (batch, idx, key[0], key[1]) for idx, key in enumerate(keys) )
+		self._WriteScratch("CREATE TEMP TABLE IF NOT EXISTS lookup_keys         \
+		                      (batch INTEGER, idx INTEGER,                      \
+		                       md5path_1 INTEGER, md5path_2 INTEGER,            \
+		                       CONSTRAINT pk_lookup_keys PRIMARY KEY (batch, idx));")
+		self._WriteScratch("INSERT INTO temp.lookup_keys                        \
+		                      (batch, idx, md5path_1, md5path_2)                \
+		                    VALUES (?, ?, ?, ?);", rows)
+		return batch
+
+
+	def _DropLookupKeys(self, batch):
+		self._WriteScratch("DELETE FROM temp.lookup_keys WHERE batch = ?;", \
+		                   [ (batch,) ])
+
+
+	def _WriteScratch(self, sql, rows = None):
+		""" Modify the temporary schema although the catalog itself is read-only """
+		self.db_handle_.execute("PRAGMA query_only = OFF;")
+		try:
+			if rows is None:
+				self.db_handle_.execute(sql)
+			else:
+				self.db_handle_.executemany(sql, rows)
+			self.db_handle_.commit()
+		finally:
+			self.db_handle_.execute("PRAGMA query_only = ON;")
 
 
 	def _ReadProperties(self):
@@ -387,11 +1297,252 @@ class Catalog:
 
 
 
+class CatalogLRU:
+	""" Bounded set of opened Catalogs that evicts the least recently used ones """
+
+	def __init__(self, max_catalogs, max_memory):
+		self.max_catalogs_ = max_catalogs
+		self.max_memory_   = max_memory
+		self.memory_       = 0
+		self.catalogs_     = collections.OrderedDict()
+		self.lock_         = threading.RLock()
+
+
+	def __str__(self):
+		return "<CatalogLRU " + str(len(self.catalogs_)) + " catalogs, " + \
+		       str(self.memory_) + " bytes>"
+
+
+	def __repr__(self):
+		return self.__str__()
+
+
+	def __len__(self):
+		return len(self.catalogs_)
+
+
+	def Get(self, catalog_hash):
+		""" Returns the opened Catalog for the given hash or None """
+		self.lock_.acquire()
+		try:
+			if catalog_hash not in self.catalogs_:
+				return None
+			catalog, memory = self.catalogs_.pop(catalog_hash)
+			self.catalogs_[catalog_hash] = (catalog, memory)
+			return catalog
+		finally:
+			self.lock_.release()
+
+
+	def Insert(self, catalog):
+		""" Keep an opened Catalog around, possibly evicting older ones """
+		memory = catalog.EstimateMemoryUsage()
+		self.lock_.acquire()
+		try:
+			self.Remove(catalog.hash)
+			self.catalogs_[catalog.hash] = (catalog, memory)
+			self.memory_ += memory
+			while len(self.catalogs_) > 1 and \
+			      (len(self.catalogs_) > self.max_catalogs_ or \
+			       self.memory_ > self.max_memory_):
+				_, (_, evicted_memory) = self.catalogs_.popitem(last = False)
+				self.memory_ -= evicted_memory
+		finally:
+			self.lock_.release()
+
+
+	def Remove(self, catalog_hash):
+		""" Forget about an opened Catalog (it is closed once unreferenced) """
+		self.lock_.acquire()
+		try:
+			if catalog_hash in self.catalogs_:
+				_, memory = self.catalogs_.pop(catalog_hash)
+				self.memory_ -= memory
+		finally:
+			self.lock_.release()
+
+
+	def Clear(self):
+		self.lock_.acquire()
+		try:
+			self.catalogs_.clear()
+			self.memory_ = 0
+		finally:
+			self.lock_.release()
+
+
+
+class StatisticsAggregator:
+	""" Sums the statistics counters of catalog trees across nested catalogs
+
+	The totals of every catalog tree are remembered by catalog hash, so that
+	unchanged nested catalogs are neither reopened nor summed up again when
+	successive revisions of a repository are aggregated.
+	"""
+
+	def __init__(self, repository):
+		self.repository_ = repository
+		self.totals_     = {}
+
+
+	def Aggregate(self, catalog_hash):
+		""" Totals of all self_* counters in the tree below the given catalog """
+		stack = [ (catalog_hash, None) ]
+		while stack:
+			current_hash, pending = stack.pop()
+			if current_hash in self.totals_:
+				continue
+			if pending is None:
+				catalog = self.repository_.RetrieveCatalog(current_hash)
+				own     = StatisticsAggregator._SelfCounters(catalog.Statistics())
+				nested  = [ reference.hash for reference in catalog.ListNested() ]
+				stack.append((current_hash, (own, nested)))
+				stack.extend([ (nested_hash, None) for nested_hash in nested \
+				               if nested_hash not in self.totals_ ])
+				continue
+			own, nested = pending
+			for nested_hash in nested:
+				for counter, value in self.totals_[nested_hash].iteritems():
+					own[counter] = own.get(counter, 0) + value
+			self.totals_[current_hash] = own
+		return dict(self.totals_[catalog_hash])
+
+
+	@staticmethod
+	def _SelfCounters(statistics):
+		return dict([ (counter[len("self_"):], value)                   \
+		              for counter, value in statistics.iteritems() \
+		              if counter.startswith("self_") ])
+
+
+
+class CatalogPrefetcher:
+	""" Downloads nested catalogs into the local cache ahead of their use
+
+	Whenever a catalog is opened, its nested catalogs are fetched by a few
+	background workers, up to max_depth levels further down.  Every opened
+	catalog grants a budget of max_bytes for the catalogs prefetched on its
+	behalf (by their compressed size, or inflated size if it is unknown).
+	Prefetching is speculative: failures are ignored and the catalog is
+	simply downloaded again once it is actually needed.  A catalog that is
+	needed while its prefetch is still queued is taken off the queue rather
+	than waited for, only prefetches already running are waited for.
+	"""
+
+	def __init__(self, repository, max_depth, max_bytes, workers):
+		self.repository_ = repository
+		self.max_depth_  = max_depth
+		self.max_bytes_  = max_bytes
+		self.executor_   = ThreadPoolExecutor(workers)
+		self.lock_       = threading.Lock()
+		self.pending_    = {}
+		self.prefetched_ = 0
+
+
+	def Schedule(self, catalog):
+		""" Start prefetching the nested catalogs below an opened catalog """
+		budget = [ self.max_bytes_ ]
+		for reference in catalog.ListNested():
+			self._Submit(reference, 1, budget)
+
+
+	def Wait(self, catalog_hash):
+		""" Block while the given catalog is being prefetched (cancels it if it
+		    did not start yet), re-raises unexpected errors of the prefetch
+		    (download failures are ignored) """
+		self.lock_.acquire()
+		try:
+			task = self.pending_.get(catalog_hash)
+			if task is None:
+				return
+			if not task.running:
+				del self.pending_[catalog_hash]  # the caller fetches it directly
+				return
+		finally:
+			self.lock_.release()
+		task.future.Result()
+
+
+	def GetPrefetchedCount(self):
+		return self.prefetched_
+
+
+	def Shutdown(self):
+		self.executor_.Shutdown(wait = False)
+
+
+	def _Submit(self, reference, depth, budget):
+		self.lock_.acquire()
+		try:
+			if reference.hash in self.pending_ or reference.size > budget[0]:
+				return
+			budget[0] -= reference.size
+			task = _PrefetchTask()
+			self.pending_[reference.hash] = task
+			task.future = self.executor_.Submit(self._Prefetch, reference, depth, \
+			                                    budget, task)
+		finally:
+			self.lock_.release()
+
+
+	def _Prefetch(self, reference, depth, budget, task):
+		self.lock_.acquire()
+		try:
+			if self.pending_.get(reference.hash) is not task:
+				return  # cancelled by Wait() while it was queued
+			task.running = True
+		finally:
+			self.lock_.release()
+		try:
+			catalog_cache = self.repository_.catalog_cache_
+			if not catalog_cache.Contains(reference.hash):
+				self.repository_._FetchCatalog(reference.hash)
+				catalog_path = catalog_cache.Lookup(reference.hash)
+				self.lock_.acquire()
+				try:
+					self.prefetched_ += 1
+					if reference.size == 0 and catalog_path is not None:
+						budget[0] -= os.path.getsize(catalog_path)
+				finally:
+					self.lock_.release()
+			if depth < self.max_depth_ and budget[0] > 0:
+				catalog = self.repository_._OpenCatalog(reference.hash)
+				for nested in catalog.ListNested():
+					self._Submit(nested, depth + 1, budget)
+		except (HTTPError, httplib.HTTPException, socket.error, IOError, \
+		        OSError, sqlite.Error, CatalogCacheMiss):
+			pass  # downloaded again once it is actually needed
+		finally:
+			self.lock_.acquire()
+			if self.pending_.get(reference.hash) is task:
+				del self.pending_[reference.hash]
+			self.lock_.release()
+
+
+
+class _PrefetchTask:
+	""" Queued or running prefetch of a catalog """
+
+	def __init__(self):
+		self.future  = None
+		self.running = False
+
+
+
 class Repository:
 	""" Abstract Wrapper around a Repository connection """
-	def __init__(self):
-		manifest_file = self.RetrieveFile(".cvmfspublished")
-		self.manifest = Manifest(manifest_file)
+	def __init__(self, cache_directory = None, cache_quota = None):
+		if cache_directory is None:
+			cache_directory = DefaultCacheDirectory()
+		if cache_quota is None:
+			cache_quota = DefaultCacheQuota()
+		self.quota_manager_ = QuotaManager(cache_directory, cache_quota)
+		self.catalog_cache_ = CatalogCache(self.quota_manager_)
+		self.open_catalogs_ = CatalogLRU(64, 256 * 1024 * 1024)
+		self.statistics_    = StatisticsAggregator(self)
+		self.prefetcher_    = None
+		self.manifest       = None
+		self.Refresh(force = True)
 
 
 	def __str__(self):
@@ -407,6 +1558,49 @@ class Repository:
 		raise Exception("Not implemented!")
 
 
+	def Refresh(self, force = False):
+		""" Revalidate the manifest once its TTL expired, True if the root changed """
+		now = time.time()
+		if not force and self.manifest is not None and \
+		   now < self.manifest_checked_ + self.manifest.ttl:
+			return False
+		manifest = self._RevalidateManifest()
+		self.manifest_checked_ = now
+		if manifest is None:
+			return False
+		previous_manifest = self.manifest
+		self.manifest     = manifest
+		if previous_manifest is None or \
+		   previous_manifest.root_catalog == manifest.root_catalog:
+			return False
+		# catalogs are cached by content hash, only the old root became useless
+		self.open_catalogs_.Remove(previous_manifest.root_catalog)
+		return True
+
+
+	def _RevalidateManifest(self):
+		""" Fetch .cvmfspublished, returns None if it did not change """
+		return Manifest(self.RetrieveFile(".cvmfspublished"))
+
+
+	def SetOpenCatalogLimits(self, max_catalogs, max_memory):
+		""" Configure how many opened Catalogs (and bytes) are kept for reuse """
+		self.open_catalogs_ = CatalogLRU(max_catalogs, max_memory)
+
+
+	def EnablePrefetch(self, max_depth = 1, max_bytes = 64 * 1024 * 1024, \
+	                   workers = 4):
+		""" Fetch nested catalogs in the background whenever a catalog is opened """
+		self.DisablePrefetch()
+		self.prefetcher_ = CatalogPrefetcher(self, max_depth, max_bytes, workers)
+
+
+	def DisablePrefetch(self):
+		if self.prefetcher_ is not None:
+			self.prefetcher_.Shutdown()
+			self.prefetcher_ = None
+
+
 	def RetrieveRootCatalog(self):
 		return self.RetrieveCatalog(self.manifest.root_catalog)
 
@@ -425,10 +1619,94 @@ class Repository:
 
 
 	def RetrieveCatalog(self, catalog_hash):
-		""" Download and open a catalog from the repository """
-		catalog_path = "data/" + catalog_hash[:2] + "/" + catalog_hash[2:] + "C"
-		catalog_file = self.RetrieveFile(catalog_path)
-		return Catalog(catalog_file)
+		""" Download and open a catalog from the repository (or reuse it) """
+		catalog = self.open_catalogs_.Get(catalog_hash)
+		if catalog is None:
+			prefetcher = self.prefetcher_
+			if prefetcher is not None:
+				prefetcher.Wait(catalog_hash)
+			catalog = self._OpenCatalog(catalog_hash)
+			self.open_catalogs_.Insert(catalog)
+			if prefetcher is not None:
+				prefetcher.Schedule(catalog)
+		return catalog
+
+
+	def _OpenCatalog(self, catalog_hash):
+		try:
+			return Catalog(None, catalog_hash, self.catalog_cache_)
+		except CatalogCacheMiss:
+			pass  # not cached (anymore)
+		catalog_file = self.RetrieveFile(_MakeObjectPath(catalog_hash, "C"))
+		return Catalog(catalog_file, catalog_hash, self.catalog_cache_)
+
+
+	def _FetchCatalog(self, catalog_hash):
+		""" Make a catalog available in the local catalog cache """
+		catalog_file = self.RetrieveFile(_MakeObjectPath(catalog_hash, "C"))
+		self.catalog_cache_.Insert(catalog_hash, catalog_file)
+
+
+	def AggregateStatistics(self, catalog_hash = None):
+		""" Summed up counters of a catalog tree (default: the root catalog) """
+		if catalog_hash is None:
+			catalog_hash = self.manifest.root_catalog
+		return self.statistics_.Aggregate(catalog_hash)
+
+
+	def BacktracePaths(self, entries):
+		""" Reconstruct the full paths of many (DirectoryEntry, Catalog) pairs """
+		paths         = []
+		known_paths   = {}
+		used_catalogs = {}
+		for dirent, catalog in entries:
+			catalog_key = catalog.hash or id(catalog)
+			if catalog_key not in used_catalogs:
+				used_catalogs[catalog_key] = catalog
+				known_paths[catalog_key]   = {}
+			paths.append(catalog.BacktracePath(dirent, known_paths[catalog_key]))
+		# directory indexes have been built, update the memory accounting
+		for catalog in used_catalogs.itervalues():
+			if self.open_catalogs_.Get(catalog.hash) is catalog:
+				self.open_catalogs_.Insert(catalog)
+		return paths
+
+
+	def LookupPaths(self, paths):
+		""" Stream (path, DirectoryEntry or None) for many paths in input order
+
+		Paths are grouped by the nested catalog they belong to and every group is
+		resolved with a single batched query.  Catalogs are visited in order of
+		the first input path they serve, so that results can be streamed early.
+		"""
+		paths      = list(paths)
+		normalized = [ path.rstrip("/") for path in paths ]
+		results    = [ None ] * len(paths)
+		resolved   = [ False ] * len(paths)
+		next_idx   = 0
+		groups     = [ (0, self.manifest.root_catalog, range(len(paths))) ]
+		while groups:
+			_, catalog_hash, indexes = heapq.heappop(groups)
+			catalog = self.RetrieveCatalog(catalog_hash)
+			owned   = []
+			nested  = collections.OrderedDict()
+			for idx in indexes:
+				reference = catalog.FindNestedForPath(normalized[idx])
+				if reference is None:
+					owned.append(idx)
+				else:
+					nested.setdefault(reference.hash, []).append(idx)
+			for nested_hash, nested_indexes in nested.iteritems():
+				heapq.heappush(groups, (nested_indexes[0], nested_hash, nested_indexes))
+
+			keys = [ _SplitMD5Path(normalized[idx]) for idx in owned ]
+			for key_idx, dirent in catalog.FindDirectoryEntriesSplitMD5(keys):
+				results[owned[key_idx]]  = dirent
+				resolved[owned[key_idx]] = True
+			while next_idx < len(paths) and resolved[next_idx]:
+				yield paths[next_idx], results[next_idx]
+				results[next_idx] = None
+				next_idx += 1
 
 
 	def FindParentCatalogOf(self, catalog):
@@ -437,13 +1715,87 @@ class Repository:
 
 
 
+class MappedFile:
+	""" Read-only file object on top of a memory mapping of the whole file
+
+	ReadBuffer() hands out buffer slices of the mapping instead of copies,
+	which _TransferStream uses to hash and inflate objects in place.
+	"""
+
+	def __init__(self, file_path):
+		self.name     = file_path
+		self.position = 0
+		with open(file_path, "rb") as f:
+			self.map_ = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+
+	def __str__(self):
+		return "<MappedFile " + self.name + ">"
+
+
+	def __repr__(self):
+		return self.__str__()
+
+
+	def __iter__(self):
+		return iter(self.readlines())
+
+
+	def ReadBuffer(self, size = -1):
+		""" Like read() but returns a buffer pointing into the mapping """
+		start = self.position
+		if size < 0:
+			self.position = len(self.map_)
+		else:
+			self.position = min(len(self.map_), start + size)
+		return buffer(self.map_, start, self.position - start)
+
+
+	def read(self, size = -1):
+		return str(self.ReadBuffer(size))
+
+
+	def readline(self):
+		end = self.map_.find("\n", self.position)
+		if end < 0:
+			return self.read()
+		return self.read(end + 1 - self.position)
+
+
+	def readlines(self):
+		return self.read().splitlines(True)
+
+
+	def seek(self, offset, whence = os.SEEK_SET):
+		if whence == os.SEEK_CUR:
+			offset += self.position
+		elif whence == os.SEEK_END:
+			offset += len(self.map_)
+		self.position = max(0, min(len(self.map_), offset))
+
+
+	def tell(self):
+		return self.position
+
+
+	def IsSQLite(self):
+		""" True for an (uncompressed) SQLite database such as an inflated catalog """
+		return self.map_[:16] == "SQLite format 3\000"
+
+
+	def close(self):
+		self.map_.close()
+
+
+
 class LocalRepository(Repository):
 	""" Concrete Repository implementation for a locally stored CernVM-FS repo """
-	def __init__(self, base_directory):
+	def __init__(self, base_directory, cache_directory = None, cache_quota = None):
 		if not os.path.isdir(base_directory):
 			raise Exception("didn't find" + base_directory)
 		self.base_directory_ = os.path.normpath(base_directory)
-		Repository.__init__(self)
+		self.manifest_stat_  = None
+		Repository.__init__(self, cache_directory, cache_quota)
 
 
 	def __str__(self):
@@ -457,57 +1809,872 @@ class LocalRepository(Repository):
 		return LocalRepository.Open(file_path)
 
 
+	def _RevalidateManifest(self):
+		""" Re-read .cvmfspublished only if it was replaced or modified """
+		stat_info = os.stat(os.path.join(self.base_directory_, ".cvmfspublished"))
+		signature = (stat_info.st_ino, stat_info.st_size, stat_info.st_mtime)
+		if signature == self.manifest_stat_:
+			return None
+		self.manifest_stat_ = signature
+		return Repository._RevalidateManifest(self)
+
+
 	@staticmethod
 	def Open(file_path):
-		return open(file_path, "rb")
+		""" Memory-map a repository file (empty files cannot be mapped) """
+		if os.path.getsize(file_path) == 0:
+			return open(file_path, "rb")
+		return MappedFile(file_path)
+
+
+
+class PooledResponse:
+	""" HTTP response whose connection goes back to its ConnectionPool on close """
+
+	def __init__(self, pool, pool_key, connection, response):
+		self.pool_       = pool
+		self.pool_key_   = pool_key
+		self.connection_ = connection
+		self.response_   = response
+		self.status      = response.status
+		self.reason      = response.reason
+
+
+	def getheader(self, name, default = None):
+		return self.response_.getheader(name, default)
+
+
+	def read(self, amt = None):
+		return self.response_.read(amt)
+
+
+	def close(self):
+		""" Recycle the connection if the response was read completely """
+		if self.connection_ is None:
+			return
+		if self.response_.isclosed() and not self.response_.will_close:
+			self.pool_._Release(self.pool_key_, self.connection_)
+		else:
+			self.connection_.close()
+		self.connection_ = None
+
+
+
+class ConnectionPool:
+	""" Keep-alive HTTP/1.1 connections per (host, proxy) shared between threads
+
+	Idle connections are kept for reuse (at most max_idle per host and proxy).
+	Unless a proxy is given per request ("DIRECT" for none), proxies are taken
+	from the environment (http_proxy, no_proxy) just as urllib2 does.  Per
+	host it counts how many connections had to be opened and how many requests
+	could reuse an already established one.
+	"""
+
+	def __init__(self, max_idle = 4, timeout = socket._GLOBAL_DEFAULT_TIMEOUT):
+		self.max_idle_   = max_idle
+		self.timeout_    = timeout
+		self.lock_       = threading.Lock()
+		self.idle_       = collections.defaultdict(list)
+		self.statistics_ = collections.defaultdict(lambda: [0, 0])
+
+
+	def __str__(self):
+		return "<ConnectionPool " + str(self.GetStatistics()) + ">"
+
+
+	def __repr__(self):
+		return self.__str__()
+
+
+	def GetStatistics(self):
+		""" Dictionary host -> (connections opened, connections reused) """
+		self.lock_.acquire()
+		try:
+			return dict([ (host, tuple(counts)) \
+			              for host, counts in self.statistics_.iteritems() ])
+		finally:
+			self.lock_.release()
+
+
+	def Open(self, url, headers = None, max_redirects = 5, proxy = None, \
+	         timeout = None):
+		""" Issue a GET request and return the PooledResponse (status unchecked) """
+		for i in range(0, max_redirects + 1):
+			response = self._Request(url, headers or {}, proxy, timeout)
+			if response.status not in (301, 302, 303, 307) or \
+			   response.getheader("location") is None:
+				return response
+			url = urlparse.urljoin(url, response.getheader("location"))
+			response.read()
+			response.close()
+		raise HTTPError(url, response.status, "too many redirects", None, None)
+
+
+	def Close(self):
+		""" Shut down all idle connections """
+		self.lock_.acquire()
+		try:
+			for connections in self.idle_.itervalues():
+				for connection in connections:
+					connection.close()
+			self.idle_.clear()
+		finally:
+			self.lock_.release()
+
+
+	def _Request(self, url, headers, proxy, timeout):
+		parsed = urlparse.urlparse(url)
+		if proxy is None and not urllib.proxy_bypass(parsed.hostname):
+			proxy = urllib.getproxies().get("http")
+		if proxy is None or proxy == "DIRECT":
+			pool_key = (parsed.netloc, None)
+			selector = urlparse.urlunparse(("", "") + parsed[2:])
+		else:
+			if "://" not in proxy:
+				proxy = "http://" + proxy
+			pool_key = (parsed.netloc, urlparse.urlparse(proxy).netloc)
+			selector = url
+
+		connection, reused = self._Acquire(pool_key, True, timeout)
+		try:
+			connection.request("GET", selector or "/", headers = headers)
+			response = connection.getresponse()
+		except (httplib.HTTPException, socket.error):
+			connection.close()
+			if not reused:
+				raise
+			# the server silently dropped the idle connection, retry once
+			connection, reused = self._Acquire(pool_key, False, timeout)
+			connection.request("GET", selector or "/", headers = headers)
+			response = connection.getresponse()
+		return PooledResponse(self, pool_key, connection, response)
+
+
+	def _Acquire(self, pool_key, allow_reuse = True, timeout = None):
+		if timeout is None:
+			timeout = self.timeout_
+		connection = None
+		self.lock_.acquire()
+		try:
+			counts = self.statistics_[pool_key[0]]
+			if allow_reuse and self.idle_[pool_key]:
+				counts[1] += 1
+				connection = self.idle_[pool_key].pop()
+			else:
+				counts[0] += 1
+		finally:
+			self.lock_.release()
+		if connection is None:
+			host = pool_key[1] or pool_key[0]
+			return httplib.HTTPConnection(host, timeout = timeout), False
+		connection.timeout = timeout
+		if connection.sock is not None and timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+			connection.sock.settimeout(timeout)
+		return connection, True
+
+
+	def _Release(self, pool_key, connection):
+		self.lock_.acquire()
+		try:
+			if len(self.idle_[pool_key]) < self.max_idle_:
+				self.idle_[pool_key].append(connection)
+				return
+		finally:
+			self.lock_.release()
+		connection.close()
+
+
+
+_default_connection_pool = None
+
+def DefaultConnectionPool():
+	""" Connection pool shared by all RemoteRepository objects by default """
+	global _default_connection_pool
+	if _default_connection_pool is None:
+		_default_connection_pool = ConnectionPool(timeout = DefaultTimeout())
+	return _default_connection_pool
+
+
+
+class HostChain:
+	""" Mirrors of a repository, ordered by their observed latency
+
+	Follows the host chain of the client's download manager (SetHostChain,
+	ProbeHosts in cvmfs/download.cc): hosts can be probed for their round trip
+	time, are sorted by it and sink to the end of the chain when they fail.
+	Unprobed hosts keep their configured order.  Recent latencies are kept per
+	host to derive percentiles for hedged requests.
+	"""
+
+	def __init__(self, hosts, window = 64):
+		if isinstance(hosts, basestring):
+			hosts = hosts.split(";")
+		self.hosts_   = [ urlparse.urlunparse(urlparse.urlparse(host.strip())) \
+		                  for host in hosts if host.strip() ]
+		if not self.hosts_:
+			raise Exception("empty host chain")
+		self.lock_    = threading.Lock()
+		self.latency_ = dict([ (host, None) for host in self.hosts_ ])
+		self.failed_  = set()
+		self.samples_ = dict([ (host, collections.deque(maxlen = window)) \
+		                       for host in self.hosts_ ])
+
+
+	def __str__(self):
+		return ";".join(self.hosts_)
+
+
+	def __len__(self):
+		return len(self.hosts_)
+
+
+	def GetHosts(self):
+		""" All hosts, best first: healthy by latency, unprobed, then failed ones """
+		self.lock_.acquire()
+		try:
+			def rank(i):
+				host = self.hosts_[i]
+				if host in self.failed_:
+					return (2, 0, i)
+				if self.latency_[host] is None:
+					return (1, 0, i)
+				return (0, self.latency_[host], i)
+			return [ self.hosts_[i] for i in sorted(range(len(self.hosts_)), key = rank) ]
+		finally:
+			self.lock_.release()
+
+
+	def RecordSuccess(self, host, seconds):
+		""" Account for a successful request (time to the response headers) """
+		self.lock_.acquire()
+		try:
+			self.failed_.discard(host)
+			self.samples_[host].append(seconds)
+			if self.latency_[host] is None:
+				self.latency_[host] = seconds
+			else:  # exponential moving average
+				self.latency_[host] = 0.8 * self.latency_[host] + 0.2 * seconds
+		finally:
+			self.lock_.release()
+
+
+	def RecordFailure(self, host):
+		self.lock_.acquire()
+		try:
+			self.failed_.add(host)
+		finally:
+			self.lock_.release()
+
+
+	def GetPercentile(self, host, percentile, min_samples = 10):
+		""" Latency percentile of a host (None until enough samples were seen) """
+		self.lock_.acquire()
+		try:
+			samples = sorted(self.samples_[host])
+		finally:
+			self.lock_.release()
+		if len(samples) < min_samples:
+			return None
+		return samples[min(len(samples) - 1, int(len(samples) * percentile / 100.0))]
+
+
+
+class ProxyChain:
+	""" Load-balanced proxy groups in the syntax of CVMFS_HTTP_PROXY
+
+	Groups are separated by ';' and tried in order, proxies within a group by
+	'|' and used in random order.  DIRECT stands for no proxy.  Without any
+	proxy configuration, the environment (http_proxy) is used.
+	"""
+
+	def __init__(self, proxies = None):
+		self.lock_ = threading.Lock()
+		if not proxies:
+			self.groups_ = [ [ None ] ]
+		else:
+			self.groups_ = [ [ proxy.strip() for proxy in group.split("|") ] \
+			                 for group in proxies.split(";") if group.strip() ]
+		self.Reset()
+
+
+	def __str__(self):
+		return ";".join([ "|".join([ str(proxy) for proxy in group ]) \
+		                  for group in self.groups_ ])
+
+
+	def __len__(self):
+		return sum([ len(group) for group in self.groups_ ])
+
+
+	def Reset(self):
+		""" Start over with a freshly shuffled first group """
+		self.lock_.acquire()
+		try:
+			self.group_ = 0
+			self.queue_ = list(self.groups_[0])
+			random.shuffle(self.queue_)
+		finally:
+			self.lock_.release()
+
+
+	def GetCurrent(self):
+		self.lock_.acquire()
+		try:
+			return self.queue_[0]
+		finally:
+			self.lock_.release()
+
+
+	def RecordFailure(self, proxy):
+		""" Switch to the next proxy (of the group) if proxy is still current """
+		self.lock_.acquire()
+		try:
+			if not self.queue_ or self.queue_[0] != proxy:
+				return
+			self.queue_.pop(0)
+			if not self.queue_:
+				self.group_ = (self.group_ + 1) % len(self.groups_)
+				self.queue_ = list(self.groups_[self.group_])
+				random.shuffle(self.queue_)
+		finally:
+			self.lock_.release()
 
 
 
 class RemoteRepository(Repository):
-	""" Concrete Repository implementation for a repository reachable by HTTP """
-	def __init__(self, repository_url):
-		self.repository_url_ = urlparse.urlunparse(urlparse.urlparse(repository_url))
-		Repository.__init__(self)
+	""" Concrete Repository implementation for a repository reachable by HTTP
+
+	repository_url may name several mirrors (a list or ';' separated like
+	CVMFS_SERVER_URL) and proxies may be given like CVMFS_HTTP_PROXY.  Mirrors
+	are probed and ordered by latency, requests fail over to the next mirror
+	(or proxy) on errors and timeouts.  With hedge_percentile, a duplicate
+	request goes to the second best mirror whenever the best one takes longer
+	than that percentile of its recent response times.  Given the cache
+	directory of a local cvmfs client, objects are taken from there first.
+	Every request times out after timeout seconds (DefaultTimeout()).
+	"""
+	def __init__(self, repository_url, cache_directory = None, cache_quota = None, \
+	             connection_pool = None, proxies = None, timeout = None,         \
+	             hedge_percentile = None, client_cache = None):
+		self.host_chain_       = HostChain(repository_url)
+		self.proxy_chain_      = ProxyChain(proxies)
+		self.repository_url_   = self.host_chain_.GetHosts()[0]
+		self.connection_pool_  = connection_pool or DefaultConnectionPool()
+		self.timeout_          = timeout if timeout is not None else DefaultTimeout()
+		self.hedge_percentile_ = hedge_percentile
+		self.manifest_etag_    = None
+		self.manifest_date_    = None
+		self.client_cache_     = None
+		if client_cache is not None:
+			self.client_cache_   = ClientCache(client_cache)
+		if len(self.host_chain_) > 1:
+			self.ProbeHosts()
+		Repository.__init__(self, cache_directory, cache_quota)
+		self.object_cache_     = ObjectCache(self.quota_manager_)
 
 
 	def __str__(self):
-		return "<RemoteRepository at " + self.repository_url_ + ">"
+		return "<RemoteRepository at " + str(self.host_chain_) + ">"
+
+
+	def ProbeHosts(self):
+		""" Order the mirrors by the round trip time of fetching .cvmfspublished """
+		failed = set()
+		for i in range(0, 2):  # twice, to fill caches first
+			for host in self.host_chain_.GetHosts():
+				if host in failed:  # e.g. timed out already, don't wait again
+					continue
+				try:
+					response = self._Attempt(host, ".cvmfspublished", \
+					                         self.proxy_chain_.GetCurrent(), None)
+					response.read()
+					response.close()
+				except (HTTPError, httplib.HTTPException, socket.error):
+					failed.add(host)
+		self.repository_url_ = self.host_chain_.GetHosts()[0]
 
 
 	def RetrieveFile(self, file_name):
-		file_url = self.repository_url_ + "/" + file_name
-		return RemoteRepository.Download(file_url)
+		if not ObjectCache.IsCacheable(file_name):
+			tmp_file = tempfile.NamedTemporaryFile('w+b')
+			self._DownloadObject(file_name, tmp_file)
+			return tmp_file
+		cached_file = self.object_cache_.Open(file_name)
+		if cached_file is not None:
+			return cached_file
+		tmp_file = self.object_cache_.NewTemporaryFile()
+		try:
+			if not self._FetchFromClientCache(file_name, tmp_file):
+				self._DownloadObject(file_name, tmp_file)
+		except:
+			tmp_file.close()
+			os.unlink(tmp_file.name)
+			raise
+		return self.object_cache_.Insert(file_name, tmp_file)
+
+
+	def GetClientCacheStatistics(self):
+		""" Hits, misses and hit ratio of the client cache (None if not used) """
+		if self.client_cache_ is None:
+			return None
+		return self.client_cache_.GetStatistics()
+
+
+	def _FetchFromClientCache(self, file_name, raw_file, inflated_file = None):
+		""" Try to fill the given temporary file(s) from the client cache """
+		if self.client_cache_ is None:
+			return False
+		if self.client_cache_.Fetch(file_name, raw_file, inflated_file):
+			return True
+		for tmp_file in (raw_file, inflated_file):
+			if tmp_file is not None:
+				tmp_file.seek(0)
+				tmp_file.truncate()
+		return False
+
+
+	def _RevalidateManifest(self):
+		""" Conditional request for .cvmfspublished (a 304 keeps the manifest) """
+		headers = {}
+		if self.manifest is not None and self.manifest_etag_ is not None:
+			headers["If-None-Match"]     = self.manifest_etag_
+		if self.manifest is not None and self.manifest_date_ is not None:
+			headers["If-Modified-Since"] = self.manifest_date_
+		manifest_file = tempfile.NamedTemporaryFile('w+b')
+		response      = self._OpenObject(".cvmfspublished", headers)
+		try:
+			if response.status == 304:
+				response.read()
+				return None
+			_TransferStream(response, ".cvmfspublished", raw_out = manifest_file)
+			self.manifest_etag_ = response.getheader("etag")
+			self.manifest_date_ = response.getheader("last-modified")
+		finally:
+			response.close()
+		manifest_file.seek(0)
+		return Manifest(manifest_file)
+
+
+	def _OpenCatalog(self, catalog_hash):
+		# a cached catalog is touched only once (every touch is a write to the
+		# quota database), by Catalog's lookup in the catalog cache
+		try:
+			return Catalog(None, catalog_hash, self.catalog_cache_)
+		except CatalogCacheMiss:
+			pass
+		if not self.object_cache_.Contains(_MakeObjectPath(catalog_hash, "C")):
+			self._FetchCatalog(catalog_hash)
+		return Repository._OpenCatalog(self, catalog_hash)
+
+
+	def _FetchCatalog(self, catalog_hash):
+		""" Download a catalog into both caches (raw and inflated) in one pass """
+		file_name     = _MakeObjectPath(catalog_hash, "C")
+		raw_file      = self.object_cache_.NewTemporaryFile()
+		inflated_file = self.catalog_cache_.NewTemporaryFile()
+		try:
+			if not self._FetchFromClientCache(file_name, raw_file, inflated_file):
+				response = self._OpenObject(file_name)
+				try:
+					_TransferStream(response, file_name, raw_file, inflated_file)
+				finally:
+					response.close()
+		except:
+			for tmp_file in (raw_file, inflated_file):
+				tmp_file.close()
+				os.unlink(tmp_file.name)
+			raise
+		self.object_cache_.Insert(file_name, raw_file).close()
+		self.catalog_cache_.Commit(catalog_hash, inflated_file)
+
+
+	def _DownloadObject(self, file_name, f):
+		""" Download a file of the repository to the provided temporary file """
+		response = self._OpenObject(file_name)
+		try:
+			_TransferStream(response, file_name, raw_out = f)
+		finally:
+			response.close()
+		f.seek(0)
+		f.flush()
+
+
+	def _OpenObject(self, file_name, headers = None):
+		""" Request a file from the best mirror, failing over to the others """
+		hosts       = self.host_chain_.GetHosts()
+		tried_hosts = set()
+		proxy_fails = 0
+		last_error  = None
+		http_error  = None
+		while len(tried_hosts) < len(hosts) and proxy_fails < len(self.proxy_chain_):
+			candidates = [ host for host in hosts if host not in tried_hosts ]
+			proxy      = self.proxy_chain_.GetCurrent()
+			try:
+				response, host = self._OpenHedged(candidates[:2], file_name, \
+				                                  proxy, headers)
+				self.repository_url_ = host
+				return response
+			except (HTTPError, httplib.HTTPException, socket.error), e:
+				last_error = e
+				if isinstance(e, HTTPError):
+					http_error = http_error or e
+				if isinstance(e, HTTPError) or proxy in (None, "DIRECT"):
+					tried_hosts.add(e.host_)
+				else:
+					self.proxy_chain_.RecordFailure(proxy)
+					proxy_fails += 1
+		if proxy_fails >= len(self.proxy_chain_):
+			self.proxy_chain_.Reset()
+		# an answer of a server (e.g. 404) tells more than a later network error
+		raise http_error or last_error
+
+
+	def _OpenHedged(self, hosts, file_name, proxy, headers):
+		""" Request from hosts[0], hedge with hosts[1] if it is unusually slow """
+		hedge_delay = None
+		if self.hedge_percentile_ is not None and len(hosts) > 1:
+			hedge_delay = self.host_chain_.GetPercentile(hosts[0], \
+			                                             self.hedge_percentile_)
+		if hedge_delay is None:
+			return self._Attempt(hosts[0], file_name, proxy, headers), hosts[0]
+
+		results = Queue.Queue()
+		claimed = []
+		lock    = threading.Lock()
+		def attempt(host):
+			try:
+				response = self._Attempt(host, file_name, proxy, headers)
+			except Exception, e:
+				results.put((host, None, e))
+				return
+			lock.acquire()
+			won = not claimed
+			claimed.append(host)
+			lock.release()
+			if won:
+				results.put((host, response, None))
+			else:
+				response.close()  # lost the race, drops the connection
+		for host in hosts[:2]:
+			worker = threading.Thread(target = attempt, args = (host,))
+			worker.daemon = True
+			worker.start()
+			if host is hosts[1]:
+				break
+			try:
+				result = results.get(timeout = hedge_delay)
+			except Queue.Empty:
+				continue  # primary is slow, hedge with the second host
+			if result[1] is None:
+				raise result[2]
+			return result[1], result[0]
+		errors = []
+		for i in range(0, 2):
+			host, response, error = results.get()
+			if response is not None:
+				return response, host
+			errors.append(error)
+		raise errors[0]
+
+
+	def _Attempt(self, host, file_name, proxy, headers):
+		""" Single request to one host, accounted in the host chain """
+		start = time.time()
+		try:
+			response = RemoteRepository._OpenUrl(host + "/" + file_name, \
+			                                     self.connection_pool_,     \
+			                                     headers, proxy, self.timeout_)
+		except (HTTPError, httplib.HTTPException, socket.error), e:
+			if isinstance(e, HTTPError):
+				if e.code >= 500:  # 4xx is about the request, not the host
+					self.host_chain_.RecordFailure(host)
+			elif proxy in (None, "DIRECT"):
+				self.host_chain_.RecordFailure(host)
+			e.host_ = host
+			raise
+		self.host_chain_.RecordSuccess(host, time.time() - start)
+		return response
 
 
 	@staticmethod
-	def Download(url):
+	def Download(url, connection_pool = None):
 		""" Download the given URL to a (returned) temporary file """
 		tmp_file = tempfile.NamedTemporaryFile('w+b')
-		RemoteRepository._DownloadToFile(url, tmp_file)
+		RemoteRepository._DownloadToFile(url, tmp_file, connection_pool)
 		return tmp_file
 
 
 	@staticmethod
-	def _DownloadToFile(url, f):
+	def _DownloadToFile(url, f, connection_pool = None):
 		""" Download the given URL to the provided temporary file """
-		response = urlopen(url)
-		f.write(response.read())
+		response = RemoteRepository._OpenUrl(url, connection_pool)
+		try:
+			_TransferStream(response, urlparse.urlparse(url).path, raw_out = f)
+		finally:
+			response.close()
 		f.seek(0)
 		f.flush()
 
 
+	@staticmethod
+	def _OpenUrl(url, connection_pool = None, headers = None, proxy = None, \
+	             timeout = None):
+		""" Send a GET request and return the response if it succeeded """
+		pool     = connection_pool or DefaultConnectionPool()
+		response = pool.Open(url, headers, proxy = proxy, timeout = timeout)
+		conditional = headers and ("If-None-Match" in headers or \
+		                           "If-Modified-Since" in headers)
+		if response.status != 200 and \
+		   not (response.status == 304 and conditional):
+			response.close()
+			raise HTTPError(url, response.status, response.reason, None, None)
+		return response
+
+
+
+class Future:
+	""" Result of an operation running in another thread """
+
+	def __init__(self):
+		self.event_     = threading.Event()
+		self.lock_      = threading.Lock()
+		self.result_    = None
+		self.error_     = None
+		self.callbacks_ = []
+
+
+	def IsDone(self):
+		return self.event_.is_set()
+
+
+	def Wait(self, timeout = None):
+		""" Block until the operation finished, False if the timeout expired """
+		return self.event_.wait(timeout)
+
+
+	def Result(self, timeout = None):
+		""" Result of the operation, re-raises its exception if it failed """
+		if not self.event_.wait(timeout):
+			raise Exception("timeout while waiting for a Future")
+		if self.error_ is not None:
+			raise self.error_[0], self.error_[1], self.error_[2]
+		return self.result_
+
+
+	def AddDoneCallback(self, callback):
+		""" Call callback(future) once done (immediately if it already is) """
+		self.lock_.acquire()
+		try:
+			if not self.event_.is_set():
+				self.callbacks_.append(callback)
+				return
+		finally:
+			self.lock_.release()
+		callback(self)
+
+
+	def SetResult(self, result):
+		self.result_ = result
+		self._Finish()
+
+
+	def SetError(self, exc_info):
+		""" Fail the operation with the sys.exc_info() of an exception """
+		self.error_ = exc_info
+		self._Finish()
+
+
+	def _Finish(self):
+		self.lock_.acquire()
+		try:
+			self.event_.set()
+			callbacks, self.callbacks_ = self.callbacks_, []
+		finally:
+			self.lock_.release()
+		for callback in callbacks:
+			callback(self)
+
+
+
+class ThreadPoolExecutor:
+	""" Fixed number of worker threads running submitted callables """
+
+	def __init__(self, max_workers):
+		self.tasks_   = Queue.Queue()
+		self.workers_ = []
+		for i in range(0, max_workers):
+			worker = threading.Thread(target = self._Work)
+			worker.daemon = True
+			worker.start()
+			self.workers_.append(worker)
+
+
+	def Submit(self, function, *args):
+		""" Schedule function(*args) and return a Future for its result """
+		future = Future()
+		self.tasks_.put((future, function, args))
+		return future
+
+
+	def Shutdown(self, wait = True):
+		""" Let the workers finish the queued tasks and stop """
+		for worker in self.workers_:
+			self.tasks_.put(None)
+		if wait:
+			for worker in self.workers_:
+				worker.join()
+
+
+	def _Work(self):
+		while True:
+			task = self.tasks_.get()
+			if task is None:
+				return
+			future, function, args = task
+			try:
+				future.SetResult(function(*args))
+			except:
+				future.SetError(sys.exc_info())
+
+
+
+class AsyncRepository:
+	""" Concurrent front end of a Repository returning Futures
+
+	Downloads run in a pool of max_concurrency I/O threads, so that many
+	objects and catalogs are in flight at once.  Decompressing and opening
+	catalogs is handed to a separate, smaller executor.  Concurrent requests
+	for the same catalog share one Future.  The synchronous Repository API
+	keeps working on this object: it is forwarded to the wrapped repository.
+	"""
+
+	def __init__(self, repository, max_concurrency = 16, cpu_workers = 2):
+		self.repository_   = repository
+		self.io_executor_  = ThreadPoolExecutor(max_concurrency)
+		self.cpu_executor_ = ThreadPoolExecutor(cpu_workers)
+		self.lock_         = threading.Lock()
+		self.in_flight_    = {}
+
+
+	def __getattr__(self, name):
+		return getattr(self.repository_, name)
+
+
+	def __str__(self):
+		return "<AsyncRepository for " + str(self.repository_) + ">"
+
+
+	def __repr__(self):
+		return self.__str__()
+
+
+	def Shutdown(self):
+		self.io_executor_.Shutdown()
+		self.cpu_executor_.Shutdown()
+
+
+	def RetrieveFileAsync(self, file_name):
+		""" Future of a file object of the given repository file """
+		return self.io_executor_.Submit(self.repository_.RetrieveFile, file_name)
+
+
+	def RetrieveManifestAsync(self):
+		""" Future of a freshly downloaded Manifest """
+		future = Future()
+		def parse(download):
+			try:
+				future.SetResult(Manifest(download.Result()))
+			except:
+				future.SetError(sys.exc_info())
+		self.RetrieveFileAsync(".cvmfspublished").AddDoneCallback(parse)
+		return future
+
+
+	def RetrieveRootCatalogAsync(self):
+		return self.RetrieveCatalogAsync(self.repository_.manifest.root_catalog)
+
+
+	def RetrieveCatalogAsync(self, catalog_hash):
+		""" Future of the opened Catalog (reusing open and in-flight ones) """
+		catalog = self.repository_.open_catalogs_.Get(catalog_hash)
+		if catalog is not None:
+			future = Future()
+			future.SetResult(catalog)
+			return future
+		self.lock_.acquire()
+		try:
+			if catalog_hash in self.in_flight_:
+				return self.in_flight_[catalog_hash]
+			future = Future()
+			self.in_flight_[catalog_hash] = future
+		finally:
+			self.lock_.release()
+		future.AddDoneCallback(lambda f: self._Landed(catalog_hash))
+
+		if self.repository_.catalog_cache_.Exists(catalog_hash):  # touched on open
+			self._OpenInExecutor(catalog_hash, None, future)
+		else:
+			file_name = _MakeObjectPath(catalog_hash, "C")
+			def downloaded(download):
+				try:
+					self._OpenInExecutor(catalog_hash, download.Result(), future)
+				except:
+					future.SetError(sys.exc_info())
+			self.RetrieveFileAsync(file_name).AddDoneCallback(downloaded)
+		return future
+
+
+	def RetrieveCatalogsAsync(self, catalog_hashes):
+		return [ self.RetrieveCatalogAsync(catalog_hash) \
+		         for catalog_hash in catalog_hashes ]
+
+
+	def _OpenInExecutor(self, catalog_hash, catalog_file, future):
+		def open_catalog():
+			if catalog_file is None:  # cached, unless it was evicted meanwhile
+				catalog = self.repository_._OpenCatalog(catalog_hash)
+			else:
+				catalog = Catalog(catalog_file, catalog_hash, \
+				                  self.repository_.catalog_cache_)
+			self.repository_.open_catalogs_.Insert(catalog)
+			return catalog
+		def opened(result):
+			try:
+				future.SetResult(result.Result())
+			except:
+				future.SetError(sys.exc_info())
+		self.cpu_executor_.Submit(open_catalog).AddDoneCallback(opened)
+
+
+	def _Landed(self, catalog_hash):
+		self.lock_.acquire()
+		try:
+			self.in_flight_.pop(catalog_hash, None)
+		finally:
+			self.lock_.release()
+
+
 
 def IsRemote(path):
-	""" Check if a given path points to remote (HTTP) or local storage """
+	""" Check if a given path (or list of mirrors) points to remote (HTTP) or
+	    local storage """
+	if isinstance(path, (list, tuple)):
+		return len(path) > 0 and IsRemote(path[0])
 	return path[0:7] == "http://"
 
 
-def OpenRepository(repo_path):
-	""" Convenience function to open a connection to a local or remote repo """
+def OpenRepository(repo_path, cache_directory = None, cache_quota = None, \
+                   proxies = None, timeout = None, hedge_percentile = None, \
+                   client_cache = None):
+	""" Convenience function to open a connection to a local or remote repo
+	    (see RemoteRepository for mirror lists and the network options) """
 	if IsRemote(repo_path):
-		return RemoteRepository(repo_path)
+		return RemoteRepository(repo_path, cache_directory, cache_quota,     \
+		                        proxies = proxies, timeout = timeout,        \
+		                        hedge_percentile = hedge_percentile,         \
+		                        client_cache = client_cache)
 	else:
-		return LocalRepository(repo_path)
+		return LocalRepository(repo_path, cache_directory, cache_quota)
 
 
 def OpenCatalog(catalog_file):
@@ -0,0 +1,131 @@
+"""
+Journal of the catalogs that download_catalog_graph.py mirrored into a
+destination, used to resume interrupted runs and to skip mirrored revisions.
+"""
+
+import hash_set
+import hashlib
+import os
+import re
+import threading
+
+
+class MirrorJournal(object):
+    """ persistent record of the catalogs mirrored into a destination
+
+    The journal file holds one '<kind> <hash>' line per fact:
+      C  the catalog object is stored and verified in the destination
+      T  the catalog and all catalogs nested below it are mirrored
+      H  the revision of this root catalog and all earlier ones are mirrored
+    """
+    object_name  = re.compile(r"^([0-9a-f]{2})/([0-9a-f]+)(-[a-z0-9]+)?C$")
+    journal_line = re.compile(r"^([CTH]) ([0-9a-f]{40}(?:-[a-z0-9]+)?)$")
+    algorithms   = { "" : "sha1", "-rmd160" : "ripemd160" }
+
+    def __init__(self, destination):
+        self.destination = destination
+        self.path        = os.path.join(destination, ".cvmfs_mirror_journal")
+        self.lock        = threading.Lock()
+        self.facts       = { "C" : hash_set.HashSet(), "T" : hash_set.HashSet(),
+                             "H" : hash_set.HashSet() }
+        if os.path.exists(self.path):
+            with open(self.path) as journal:
+                for line in journal:
+                    # skips e.g. a last line cut short by an interruption
+                    match = self.journal_line.match(line.rstrip("\n"))
+                    if match is None:
+                        continue
+                    try:
+                        self.facts[match.group(1)].add(match.group(2))
+                    except ValueError:
+                        pass # unsupported hash algorithm
+        self.journal = None
+
+    def scan(self):
+        """ checks the destination: journaled catalogs need to exist, others
+            are verified against their content hash and adopted if they match
+            (partial leftovers of interrupted downloads are removed) """
+        stored  = hash_set.HashSet()
+        adopted = 0
+        data_dir = os.path.join(self.destination, "data")
+        for prefix in sorted(os.listdir(data_dir)) if os.path.isdir(data_dir) else []:
+            for name in os.listdir(os.path.join(data_dir, prefix)):
+                path = os.path.join(data_dir, prefix, name)
+                if name.endswith(".part"):
+                    os.unlink(path)
+                    continue
+                match = self.object_name.match(prefix + "/" + name)
+                if match is None:
+                    continue
+                catalog_hash = match.group(1) + match.group(2) + (match.group(3) or "")
+                if catalog_hash not in self.facts["C"]:
+                    if not self.verify(path, prefix + "/" + name):
+                        continue
+                    adopted += 1
+                stored.add(catalog_hash)
+        missing = [ catalog_hash for catalog_hash in self.facts["C"]
+                    if catalog_hash not in stored ]
+        self.facts["C"] = stored
+        if missing:
+            # the trees containing the missing catalogs are unknown, so no tree
+            # counts as complete anymore (stored catalogs are still reused)
+            self.facts["T"] = hash_set.HashSet()
+            self.facts["H"] = hash_set.HashSet()
+        self._rewrite()
+        return adopted, len(missing)
+
+    @staticmethod
+    def new_hasher(object_name):
+        """ (hasher, expected hex digest) for a catalog name (xx/...C) or
+            (None, None) if it cannot be verified """
+        match = MirrorJournal.object_name.match(object_name)
+        if match is None:
+            return None, None
+        try:
+            hasher = hashlib.new(MirrorJournal.algorithms[match.group(3) or ""])
+        except (KeyError, ValueError):
+            return None, None
+        return hasher, match.group(1) + match.group(2)
+
+    @staticmethod
+    def verify(path, object_name):
+        """ compares the content hash of a stored catalog with its name (xx/...C) """
+        hasher, expected_digest = MirrorJournal.new_hasher(object_name)
+        if hasher is None:
+            return False
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), ""):
+                hasher.update(block)
+        return hasher.hexdigest() == expected_digest
+
+    def is_stored(self, catalog_hash):
+        return catalog_hash in self.facts["C"]
+
+    def is_complete(self, catalog_hash):
+        return catalog_hash in self.facts["T"]
+
+    def is_history_complete(self, catalog_hash):
+        return catalog_hash in self.facts["H"]
+
+    def record(self, kind, catalog_hash):
+        with self.lock:
+            if catalog_hash in self.facts[kind]:
+                return
+            self.facts[kind].add(catalog_hash)
+            self.journal.write(kind + " " + catalog_hash + "\n")
+            self.journal.flush()
+
+    def close(self):
+        self.journal.close()
+
+    def _rewrite(self):
+        """ compacts the journal (atomically) and reopens it for appending """
+        if self.journal is not None:
+            self.journal.close()
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as journal:
+            for kind in ("C", "T", "H"):
+                for catalog_hash in sorted(self.facts[kind]):
+                    journal.write(kind + " " + catalog_hash + "\n")
+        os.rename(tmp_path, self.path)
+        self.journal = open(self.path, "a")
@@ -0,0 +1,119 @@
+"""
+Token buckets and priority ordering of download_scheduler
+(python2 -m unittest discover add-ons/tools/test)
+"""
+
+import os
+import StringIO
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import download_scheduler
+
+
+class TestTokenBucket(unittest.TestCase):
+    def _bucket(self, rate, burst = None):
+        bucket = download_scheduler.TokenBucket(rate, burst)
+        bucket.timestamp = 0.0
+        return bucket
+
+    def test_starts_empty_and_goes_into_debt(self):
+        bucket = self._bucket(100)
+        self.assertAlmostEqual(bucket.take(50, 0.0), 0.5)
+        self.assertAlmostEqual(bucket.take(50, 0.5), 0.5)
+        self.assertAlmostEqual(bucket.take(0, 1.0), 0.0)
+        self.assertAlmostEqual(bucket.tokens, 0.0)
+
+    def test_refill_is_capped_by_burst(self):
+        bucket = self._bucket(100, burst = 30)
+        self.assertEqual(bucket.take(0, 10.0), 0.0)
+        self.assertAlmostEqual(bucket.tokens, 30.0)
+        self.assertAlmostEqual(bucket.take(80, 10.0), 0.5)
+
+
+class TestDownloadScheduler(unittest.TestCase):
+    def test_without_limits_nothing_waits(self):
+        scheduler = download_scheduler.DownloadScheduler()
+        start     = time.time()
+        for i in range(100):
+            scheduler.acquire_request("host")
+            scheduler.acquire_bytes("host", 1024 * 1024)
+        self.assertTrue(time.time() - start < 0.5)
+
+    def test_request_rate_is_capped_per_host(self):
+        scheduler = download_scheduler.DownloadScheduler(max_requests = 50)
+        start     = time.time()
+        for i in range(11):
+            scheduler.acquire_request("host")
+        elapsed = time.time() - start
+        # the first request runs into debt right away, the others wait 1/50 s
+        self.assertTrue(0.18 <= elapsed < 0.5, elapsed)
+        start = time.time()
+        scheduler.acquire_request("other host")
+        self.assertTrue(time.time() - start < 0.05)
+
+    def test_bandwidth_is_capped(self):
+        scheduler = download_scheduler.DownloadScheduler(max_bandwidth = 1000000)
+        start     = time.time()
+        for i in range(5):
+            scheduler.acquire_bytes("host", 50000)
+        self.assertTrue(0.18 <= time.time() - start < 0.5)
+
+    def test_most_urgent_waiting_download_goes_first(self):
+        scheduler = download_scheduler.DownloadScheduler(max_requests = 5)
+        scheduler.acquire_request("host")  # the host is busy for 0.2 s now
+        served  = []
+        lock    = threading.Lock()
+        def download(priority):
+            scheduler.acquire_request("host", priority)
+            with lock:
+                served.append(priority)
+        priorities = [ download_scheduler.PRIORITY_CHUNK,
+                       download_scheduler.PRIORITY_FILE,
+                       download_scheduler.PRIORITY_METADATA ]
+        threads = [ threading.Thread(target = download, args = (priority,))
+                    for priority in priorities ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+        self.assertEqual(served, sorted(priorities))
+
+    def test_report(self):
+        scheduler = download_scheduler.DownloadScheduler(max_bandwidth = 1024 * 1024)
+        scheduler.acquire_request("host")
+        scheduler.acquire_bytes("host", 1024)
+        out = StringIO.StringIO()
+        scheduler.report(out)
+        lines = out.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("host: 1 requests, 1024 bytes in"))
+        self.assertTrue(lines[1].endswith("(cap: 1.0 MB/s)"), lines[1])
+        self.assertTrue(lines[2].endswith("(cap: none)"), lines[2])
+
+
+class TestHelpers(unittest.TestCase):
+    def test_priority_for(self):
+        base = "http://host/cvmfs/repo/"
+        self.assertEqual(download_scheduler.priority_for(base + ".cvmfspublished"),
+                         download_scheduler.PRIORITY_METADATA)
+        self.assertEqual(download_scheduler.priority_for(base + "data/ab/" + "c" * 38 + "C"),
+                         download_scheduler.PRIORITY_METADATA)
+        self.assertEqual(download_scheduler.priority_for(base + "data/ab/" + "c" * 38),
+                         download_scheduler.PRIORITY_FILE)
+        self.assertEqual(download_scheduler.priority_for(base + "data/ab/" + "c" * 38 + "-rmd160P"),
+                         download_scheduler.PRIORITY_CHUNK)
+
+    def test_parse_rate(self):
+        self.assertEqual(download_scheduler.parse_rate(None), None)
+        self.assertEqual(download_scheduler.parse_rate("500"), 500.0)
+        self.assertEqual(download_scheduler.parse_rate("200k"), 200.0 * 1024)
+        self.assertEqual(download_scheduler.parse_rate("1.5M"), 1.5 * 1024 ** 2)
+        self.assertEqual(download_scheduler.parse_rate("1G"), 1024.0 ** 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+"""
+hash_set.HashSet and ExternalHashSorter checked against the built-in set
+(python2 -m unittest discover add-ons/tools/test)
+"""
+
+import hashlib
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import hash_set
+
+
+def _hashes(count, seed = 0):
+    """ hash strings in all supported flavors (algorithm and suffix) """
+    flavors = [ "", "C", "P", "-rmd160", "-rmd160C", "-shake128X" ]
+    return [ hashlib.sha1("%d.%d" % (seed, i)).hexdigest() + flavors[i % len(flavors)]
+             for i in range(count) ]
+
+
+class TestHashSet(unittest.TestCase):
+    def test_encode_decode_roundtrip(self):
+        for hash_string in _hashes(12):
+            record = hash_set.encode(hash_string)
+            self.assertEqual(len(record), hash_set.RECORD_SIZE)
+            self.assertEqual(hash_set.decode(record), hash_string)
+        self.assertRaises(ValueError, hash_set.encode, "0" * 40 + "-md4")
+
+    def test_malformed_hashes_are_rejected(self):
+        full = _hashes(1)[0]
+        hs   = hash_set.HashSet([ full ])
+        for malformed in (full[:24], full[:10], full[:39], "", "x" * 40,
+                          full[:24] + "C", full[:30] + "-rmd160"):
+            self.assertRaises(ValueError, hash_set.encode, malformed)
+            self.assertRaises(ValueError, hs.add, malformed)
+        self.assertRaises(AssertionError, hs.add_record, "\1" * 10)
+        self.assertEqual(list(hs), [ full ])
+        self.assertTrue(full in hs)
+
+    def test_add_discard_iterate_like_set(self):
+        for bloom_bits in (None, 1024):
+            hashes    = _hashes(3000)
+            reference = set()
+            hs        = hash_set.HashSet(capacity = 16, bloom_bits = bloom_bits)
+            rng       = random.Random(42)
+            for i in range(20000):
+                hash_string = rng.choice(hashes)
+                if rng.random() < 0.6:
+                    self.assertEqual(hs.add(hash_string),
+                                     hash_string not in reference)
+                    reference.add(hash_string)
+                else:
+                    hs.discard(hash_string)
+                    reference.discard(hash_string)
+                if i % 1000 == 0:
+                    self.assertEqual(set(hs), reference)
+            self.assertEqual(len(hs), len(reference))
+            self.assertEqual(set(hs), reference)
+            for hash_string in hashes:
+                self.assertEqual(hash_string in hs, hash_string in reference)
+
+    def test_discard_keeps_colliding_entries_reachable(self):
+        # all records share their home slot, discarding shifts the rest back
+        hashes = [ "%016x" % 0 + "%024x" % i for i in range(10) ]
+        hs     = hash_set.HashSet(hashes)
+        for hash_string in hashes[::2]:
+            hs.discard(hash_string)
+        self.assertEqual(sorted(hs), hashes[1::2])
+        for hash_string in hashes[1::2]:
+            self.assertTrue(hash_string in hs)
+        hs.discard(hashes[0])  # no longer there
+        self.assertEqual(len(hs), 5)
+
+    def test_update_and_ior(self):
+        first, second = _hashes(500, 1), _hashes(800, 2)
+        overlap       = first[:200]
+        hs = hash_set.HashSet(first)
+        hs.update(second + overlap)  # from an iterable of strings
+        self.assertEqual(set(hs), set(first + second))
+        other = hash_set.HashSet(_hashes(300, 3) + second[:100])
+        same  = hs
+        hs   |= other
+        self.assertTrue(hs is same)
+        self.assertEqual(set(hs), set(first + second + _hashes(300, 3)))
+        self.assertEqual(len(hs), 500 + 800 + 300)
+
+    def test_readers_while_growing(self):
+        hashes = _hashes(20000)
+        hs     = hash_set.HashSet(capacity = 16, bloom_bits = 1024)
+        done   = threading.Event()
+        errors = []
+        def read():
+            try:
+                while not done.is_set():
+                    added = len(hs)  # counted after the record is stored
+                    for hash_string in hashes[max(0, added - 200):added]:
+                        if hash_string not in hs:
+                            errors.append(hash_string)
+            except Exception, e:
+                errors.append(e)
+        readers = [ threading.Thread(target = read) for i in range(3) ]
+        for reader in readers:
+            reader.start()
+        for hash_string in hashes:
+            hs.add(hash_string)
+        done.set()
+        for reader in readers:
+            reader.join()
+        self.assertEqual(errors, [])
+
+    def test_sorted_records(self):
+        hashes = _hashes(100)
+        hs     = hash_set.HashSet(hashes)
+        self.assertEqual(hs.sorted_records(),
+                         sorted([ hash_set.encode(h) for h in hashes ]))
+
+
+class TestExternalHashSorter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_multi_pass_merge_with_duplicates(self):
+        messages = []
+        sorter   = hash_set.ExternalHashSorter(0, self.temp_dir, fan_in = 2,
+                                               progress = messages.append)
+        hashes   = _hashes(5000)
+        rng      = random.Random(7)
+        added    = [ rng.choice(hashes) for i in range(12000) ]
+        sorter.update(added[:6000])
+        sorter.update(hash_set.HashSet(added[6000:]))
+        self.assertTrue(len(sorter.runs) > 2)  # 1024 hashes per run
+        # the digests differ, so record order is the order of the strings
+        self.assertEqual(list(sorter), sorted(set(added)))
+        self.assertTrue([ m for m in messages if m.startswith("merging 2 of") ])
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+    def test_empty(self):
+        sorter = hash_set.ExternalHashSorter(1024, self.temp_dir)
+        self.assertEqual(list(sorter), [])
+        self.assertEqual(os.listdir(self.temp_dir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
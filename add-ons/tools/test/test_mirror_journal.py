@@ -0,0 +1,73 @@
+"""
+Loading and rescanning the MirrorJournal of download_catalog_graph.py
+(python2 -m unittest discover add-ons/tools/test)
+"""
+
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import zlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mirror_journal import MirrorJournal
+
+
+class TestMirrorJournal(unittest.TestCase):
+    def setUp(self):
+        self.destination = tempfile.mkdtemp()
+        self.journal_path = os.path.join(self.destination, ".cvmfs_mirror_journal")
+
+    def tearDown(self):
+        shutil.rmtree(self.destination)
+
+    def _store(self, content):
+        """ stores a catalog object in the destination, returns its hash """
+        data         = zlib.compress(content)
+        catalog_hash = hashlib.sha1(data).hexdigest()
+        prefix_dir   = os.path.join(self.destination, "data", catalog_hash[:2])
+        if not os.path.isdir(prefix_dir):
+            os.makedirs(prefix_dir)
+        with open(os.path.join(prefix_dir, catalog_hash[2:] + "C"), "wb") as f:
+            f.write(data)
+        return catalog_hash
+
+    def test_truncated_last_line_is_skipped(self):
+        stored  = [ self._store("catalog %d" % i) for i in range(3) ]
+        lost    = hashlib.sha1("lost").hexdigest()
+        for cut in (24, 10, 1):
+            with open(self.journal_path, "w") as journal:
+                for catalog_hash in stored:
+                    journal.write("C " + catalog_hash + "\n")
+                journal.write("T " + stored[0] + "\n")
+                journal.write("C " + lost[:cut])
+            journal = MirrorJournal(self.destination)
+            self.assertEqual(sorted(journal.facts["C"]), sorted(stored))
+            self.assertEqual(list(journal.facts["T"]), [ stored[0] ])
+            self.assertEqual(journal.scan(), (0, 0))
+            self.assertTrue(journal.is_complete(stored[0]))
+            journal.record("H", stored[0])
+            journal.close()
+            with open(self.journal_path) as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines, sorted([ "C " + h for h in stored ]) +
+                                    [ "T " + stored[0], "H " + stored[0] ])
+
+    def test_scan_adopts_and_reports_missing(self):
+        stored  = self._store("stored")
+        missing = hashlib.sha1("missing").hexdigest()
+        with open(self.journal_path, "w") as journal:
+            journal.write("C " + missing + "\n")
+            journal.write("T " + missing + "\n")
+        journal = MirrorJournal(self.destination)
+        self.assertEqual(journal.scan(), (1, 1))
+        self.assertTrue(journal.is_stored(stored))
+        self.assertFalse(journal.is_stored(missing))
+        self.assertFalse(journal.is_complete(missing))
+        journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,611 @@
+"""
+RemoteRepository of legacy/cvmfs.py (mirror fail over, catalog cache, manifest
+revalidation, client cache, catalog walks and lookups) against local mock HTTP
+servers (python2 -m unittest discover add-ons/tools/test)
+"""
+
+import BaseHTTPServer
+import SocketServer
+import StringIO
+import hashlib
+import imp
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+import zlib
+from urllib2 import HTTPError
+
+# loaded under its own name, cvmfs is the python-cvmfsutils package
+cvmfs = imp.load_source("cvmfs_legacy",
+                        os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                     "..", "legacy", "cvmfs.py"))
+
+
+def _object(content):
+    """ (object path, compressed content) of a content-addressed file """
+    raw    = zlib.compress(content)
+    digest = hashlib.sha1(raw).hexdigest()
+    return "data/" + digest[:2] + "/" + digest[2:], raw
+
+
+def _catalog(revision = 1, root_path = "", entries = (), nested = ()):
+    """ (hash, compressed content) of a catalog with its root entry, the given
+        (path, flags) entries and (mountpoint, hash) references to nested
+        catalogs (their mountpoint entries are added as well) """
+    db_path = tempfile.mktemp()
+    db      = sqlite3.connect(db_path)
+    db.executescript("""
+        CREATE TABLE catalog (md5path_1 INTEGER, md5path_2 INTEGER,
+          parent_1 INTEGER, parent_2 INTEGER, hardlinks INTEGER, hash BLOB,
+          size INTEGER, mode INTEGER, mtime INTEGER, flags INTEGER, name TEXT,
+          symlink TEXT, uid INTEGER, gid INTEGER, xattr BLOB);
+        CREATE TABLE nested_catalogs (path TEXT, sha1 TEXT, size INTEGER);
+        CREATE TABLE properties (key TEXT, value TEXT);
+        INSERT INTO properties VALUES ('schema', '2.5');
+        INSERT INTO properties VALUES ('schema_revision', '3');
+        INSERT INTO properties VALUES ('last_modified', '1400000000');""")
+    db.execute("INSERT INTO properties VALUES ('revision', ?)", (str(revision),))
+    if root_path:
+        db.execute("INSERT INTO properties VALUES ('root_prefix', ?)", (root_path,))
+    root_flags = 1 if not root_path else 1 | 32  # nested catalog root
+    rows       = [ (root_path, root_flags) ] + list(entries) + \
+                 [ (path, 1 | 2) for path, catalog_hash in nested ]
+    for path, flags in rows:
+        md5path_1, md5path_2 = cvmfs._SplitMD5Path(path)
+        parent_1, parent_2   = cvmfs._SplitMD5Path(path.rsplit("/", 1)[0]) \
+                               if path else (0, 0)
+        mode = 16877 if flags & 1 else 33188
+        db.execute("INSERT INTO catalog VALUES (?, ?, ?, ?, 1, NULL, 4096, ?, \
+                    1400000000, ?, ?, '', 0, 0, NULL)",
+                   (md5path_1, md5path_2, parent_1, parent_2, mode, flags,
+                    path.rsplit("/", 1)[-1]))
+    for path, catalog_hash in nested:
+        db.execute("INSERT INTO nested_catalogs VALUES (?, ?, 0)",
+                   (path, catalog_hash))
+    db.commit()
+    db.close()
+    with open(db_path, "rb") as f:
+        raw = zlib.compress(f.read())
+    os.unlink(db_path)
+    return hashlib.sha1(raw).hexdigest(), raw
+
+
+def _manifest(catalog_hash, revision = 1):
+    return "C" + catalog_hash + "\nB0\nRd41d8cd98f00b204e9800998ecf8427e\n" + \
+           "D240\nS" + str(revision) + "\nNtest.cern.ch\nT0\n--\nsignature\n"
+
+
+_CATALOG_HASH, _CATALOG = _catalog()
+_MANIFEST = _manifest(_CATALOG_HASH)
+_PRESENT_NAME, _PRESENT = _object("present")
+_MISSING_NAME           = _object("missing")[0]
+
+
+class MockMirror(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ serves a fixed set of files after a delay, or status for everything """
+    daemon_threads      = True
+    allow_reuse_address = True
+
+    def __init__(self, files, delay = 0.0, status = None, handler = None):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0),
+                                           handler or _Handler)
+        self.files    = files
+        self.delay    = delay
+        self.status   = status
+        self.requests = []
+        self.down     = False
+        self.url      = "http://127.0.0.1:%d" % self.server_address[1]
+        thread = threading.Thread(target = self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def handle_error(self, request, client_address):
+        pass  # e.g. clients dropping keep-alive connections
+
+    def break_down(self):
+        """ refuses new connections and drops requests on open ones """
+        self.down = True
+        self.shutdown()
+        self.server_close()
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.server.down:
+            self.close_connection = 1
+            return
+        self.server.requests.append(self.path)
+        time.sleep(self.server.delay)
+        body   = self.server.files.get(self.path.lstrip("/"))
+        status = self.server.status or (200 if body is not None else 404)
+        if status != 200:
+            body = ""
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "close")  # no threads left behind
+        self.end_headers()
+        self.close_connection = 1
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ConditionalHandler(_Handler):
+    """ sends an ETag (the content hash) and answers 304 if it still matches """
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.get("If-None-Match")))
+        body = self.server.files.get(self.path.lstrip("/"))
+        if body is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _dead_url():
+    """ URL of a local port nobody listens on """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return "http://127.0.0.1:%d" % port
+
+
+class BlackHole(object):
+    """ accepts connections (in the backlog) but never answers """
+    def __init__(self):
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(16)
+        self.url  = "http://127.0.0.1:%d" % self.sock.getsockname()[1]
+        self.down = False
+
+    def break_down(self):
+        self.down = True
+        self.sock.close()
+
+
+_FILES = { ".cvmfspublished"                       : _MANIFEST,
+           cvmfs._MakeObjectPath(_CATALOG_HASH, "C") : _CATALOG,
+           _PRESENT_NAME                             : _PRESENT }
+
+
+class TestTransferStream(unittest.TestCase):
+    class _Sink(object):
+        def __init__(self):
+            self.size    = 0
+            self.largest = 0
+            self.hasher  = hashlib.sha1()
+
+        def write(self, data):
+            self.size    += len(data)
+            self.largest  = max(self.largest, len(data))
+            self.hasher.update(data)
+
+    def test_inflates_in_bounded_chunks(self):
+        content     = "\0" * (64 * 1024 * 1024)
+        compressed  = zlib.compress(content)
+        digest      = hashlib.sha1(compressed).hexdigest()
+        object_name = "data/" + digest[:2] + "/" + digest[2:]
+        self.assertTrue(len(compressed) < 64 * 1024)  # a single block
+        raw, inflated = self._Sink(), self._Sink()
+        cvmfs._TransferStream(StringIO.StringIO(compressed), object_name,
+                              raw, inflated, max_chunk = 256 * 1024)
+        self.assertEqual(raw.size, len(compressed))
+        self.assertEqual(inflated.size, len(content))
+        self.assertTrue(inflated.largest <= 256 * 1024)
+        self.assertEqual(inflated.hasher.hexdigest(),
+                         hashlib.sha1(content).hexdigest())
+        self.assertRaises(Exception, cvmfs._TransferStream,
+                          StringIO.StringIO(compressed + "x"), object_name,
+                          inflated_out = self._Sink())
+
+
+class TestMirrorFailOver(unittest.TestCase):
+    files = _FILES
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.fast      = MockMirror(self.files)
+        self.slow      = MockMirror(self.files, delay = 0.05)
+        self.dead      = _dead_url()
+        self.servers   = [ self.fast, self.slow ]
+
+    def tearDown(self):
+        for server in self.servers:
+            if not server.down:
+                server.break_down()
+        shutil.rmtree(self.cache_dir)
+
+    def _open(self, hosts):
+        return cvmfs.RemoteRepository(";".join(hosts), self.cache_dir,
+                                      timeout = 2)
+
+    def test_probing_orders_mirrors(self):
+        repo = self._open([ self.dead, self.slow.url, self.fast.url ])
+        self.assertEqual(repo.host_chain_.GetHosts(),
+                         [ self.fast.url, self.slow.url, self.dead ])
+        self.assertEqual(repo.manifest.name, "test.cern.ch")
+
+    def test_fails_over_to_a_working_mirror(self):
+        repo = self._open([ self.slow.url, self.fast.url ])
+        self.fast.break_down()  # the best mirror goes away after probing
+        retrieved = repo.RetrieveFile(_PRESENT_NAME)
+        self.assertEqual(retrieved.read(), _PRESENT)
+        self.assertEqual(repo.host_chain_.GetHosts(),
+                         [ self.slow.url, self.fast.url ])
+
+    def test_missing_object_raises_http_error(self):
+        repo  = self._open([ self.dead, self.slow.url, self.fast.url ])
+        hosts = repo.host_chain_.GetHosts()
+        with self.assertRaises(HTTPError) as context:
+            repo.RetrieveFile(_MISSING_NAME)
+        self.assertEqual(context.exception.code, 404)
+        # both live mirrors were asked, none of them counts as failed now
+        self.assertIn("/" + _MISSING_NAME, self.fast.requests)
+        self.assertIn("/" + _MISSING_NAME, self.slow.requests)
+        self.assertEqual(repo.host_chain_.GetHosts(), hosts)
+
+    def test_black_holed_mirror_times_out(self):
+        black_hole = BlackHole()
+        self.servers.append(black_hole)
+        start = time.time()
+        repo  = cvmfs.OpenRepository(self.fast.url + ";" + black_hole.url,
+                                     self.cache_dir, timeout = 0.5)
+        self.assertTrue(isinstance(repo, cvmfs.RemoteRepository))
+        self.assertEqual(repo.host_chain_.GetHosts(),
+                         [ self.fast.url, black_hole.url ])
+        self.fast.break_down()  # only the black hole is left
+        self.assertRaises(socket.error, repo.RetrieveFile, _PRESENT_NAME)
+        self.assertTrue(time.time() - start < 5)
+
+    def test_open_repository_with_a_list_of_mirrors(self):
+        repo = cvmfs.OpenRepository([ self.dead, self.fast.url ],
+                                    self.cache_dir, timeout = 2,
+                                    proxies = "DIRECT")
+        self.assertEqual(repo.host_chain_.GetHosts(), [ self.fast.url, self.dead ])
+        self.assertEqual(repo.timeout_, 2)
+        self.assertEqual(repo.RetrieveFile(_PRESENT_NAME).read(), _PRESENT)
+
+    def test_server_errors_mark_the_mirror_failed(self):
+        broken = MockMirror(self.files, status = 503)
+        self.servers.append(broken)
+        repo = self._open([ broken.url, self.slow.url ])
+        self.assertEqual(repo.host_chain_.GetHosts(),
+                         [ self.slow.url, broken.url ])
+        self.assertEqual(repo.RetrieveFile(_PRESENT_NAME).read(), _PRESENT)
+
+
+class TestCatalogCacheEviction(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.mirror    = MockMirror(_FILES)
+
+    def tearDown(self):
+        self.mirror.break_down()
+        shutil.rmtree(self.cache_dir)
+
+    def _evict_after_lookup(self, repo, lookup):
+        """ another process evicts the catalog right after it was found """
+        catalog_cache = repo.catalog_cache_
+        contains      = catalog_cache.Contains
+        lookups       = [ 0 ]
+        def evicting_contains(catalog_hash):
+            found = contains(catalog_hash)
+            lookups[0] += 1
+            if found and lookups[0] == lookup:
+                os.unlink(catalog_cache.GetPath(catalog_hash))
+            return found
+        catalog_cache.Contains = evicting_contains
+
+    def test_evicted_catalog_is_fetched_again(self):
+        repo = cvmfs.RemoteRepository(self.mirror.url, self.cache_dir)
+        repo.RetrieveRootCatalog()
+        repo.SetOpenCatalogLimits(0, 0)  # nothing stays open
+        repo.object_cache_.Contains = lambda file_name: False
+        # evicted between the cache lookup and opening the database
+        self._evict_after_lookup(repo, 1)
+        catalog = repo.RetrieveRootCatalog()
+        self.assertEqual(catalog.hash, _CATALOG_HASH)
+        self.assertTrue(catalog.FindDirectoryEntry("").IsDirectory())
+
+    def test_cached_catalog_is_touched_once(self):
+        repo = cvmfs.RemoteRepository(self.mirror.url, self.cache_dir)
+        repo.RetrieveRootCatalog()
+        repo.SetOpenCatalogLimits(0, 0)
+        quota_manager = repo.quota_manager_
+        touched       = []
+        touch         = quota_manager.Touch
+        quota_manager.Touch = lambda path: touched.append(path) or touch(path)
+        repo.RetrieveRootCatalog()
+        self.assertEqual(len(touched), 1)
+        self.assertEqual(self.mirror.requests.count(
+                           "/" + cvmfs._MakeObjectPath(_CATALOG_HASH, "C")), 1)
+
+    def test_open_evicted_catalog_raises_cache_miss(self):
+        repo = cvmfs.RemoteRepository(self.mirror.url, self.cache_dir)
+        repo.RetrieveRootCatalog()
+        self._evict_after_lookup(repo, 1)
+        self.assertRaises(cvmfs.CatalogCacheMiss, cvmfs.Catalog, None,
+                          _CATALOG_HASH, repo.catalog_cache_)
+
+
+class TestManifestRevalidation(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.files     = dict(_FILES)
+        self.mirror    = MockMirror(self.files, handler = _ConditionalHandler)
+        self.pool      = cvmfs.ConnectionPool()
+
+    def tearDown(self):
+        self.pool.Close()
+        self.mirror.break_down()
+        shutil.rmtree(self.cache_dir)
+
+    def _open(self):
+        return cvmfs.RemoteRepository(self.mirror.url, self.cache_dir,
+                                      connection_pool = self.pool)
+
+    def _manifest_requests(self):
+        return [ if_none_match for path, if_none_match in self.mirror.requests
+                 if path == "/.cvmfspublished" ]
+
+    def test_unchanged_manifest_is_not_modified(self):
+        repo = self._open()
+        self.assertFalse(repo.Refresh(force = True))
+        opened, reused = self.pool.GetStatistics().values()[0]
+        self.assertFalse(repo.Refresh(force = True))
+        # one 304 on the connection kept alive before
+        self.assertEqual(self.pool.GetStatistics().values()[0],
+                         (opened, reused + 1))
+        etag = '"' + hashlib.sha1(_MANIFEST).hexdigest() + '"'
+        self.assertEqual(self._manifest_requests()[-2:], [ etag, etag ])
+        self.assertEqual(repo.manifest.root_catalog, _CATALOG_HASH)
+
+    def test_changed_root_catalog(self):
+        repo = self._open()
+        repo.RetrieveRootCatalog()
+        self.assertTrue(repo.open_catalogs_.Get(_CATALOG_HASH) is not None)
+        new_hash, new_catalog = _catalog(2)
+        self.files[cvmfs._MakeObjectPath(new_hash, "C")] = new_catalog
+        self.files[".cvmfspublished"] = _manifest(new_hash, 2)
+        self.assertTrue(repo.Refresh(force = True))
+        self.assertEqual(repo.manifest.root_catalog, new_hash)
+        self.assertTrue(repo.open_catalogs_.Get(_CATALOG_HASH) is None)
+        self.assertEqual(repo.RetrieveRootCatalog().revision, "2")
+        # the new ETag is sent next time
+        self.assertFalse(repo.Refresh(force = True))
+        self.assertEqual(self._manifest_requests()[-1],
+                         '"' + hashlib.sha1(_manifest(new_hash, 2)).hexdigest() + '"')
+
+    def test_not_modified_without_conditional_request_fails(self):
+        self.mirror.break_down()
+        self.mirror = MockMirror(self.files, status = 304)
+        self.assertRaises(HTTPError, cvmfs.RemoteRepository._OpenUrl,
+                          self.mirror.url + "/.cvmfspublished")
+
+
+class TestClientCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir  = tempfile.mkdtemp()
+        self.client_dir = tempfile.mkdtemp()
+        self.mirror     = MockMirror(_FILES)
+
+    def tearDown(self):
+        self.mirror.break_down()
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.client_dir)
+
+    def _put(self, object_name, inflated):
+        """ stores an object the way the client does: inflated, no suffix """
+        digest = object_name[len("data/"):].replace("/", "").rstrip("C")
+        path   = os.path.join(self.client_dir, digest[:2], digest[2:])
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(inflated)
+
+    def _open(self):
+        return cvmfs.RemoteRepository(self.mirror.url, self.cache_dir,
+                                      client_cache = self.client_dir)
+
+    def _downloaded(self, object_name):
+        return "/" + object_name in self.mirror.requests
+
+    def test_verified_object_is_served(self):
+        self._put(_PRESENT_NAME, "present")
+        repo = self._open()
+        self.assertEqual(repo.RetrieveFile(_PRESENT_NAME).read(), _PRESENT)
+        self.assertFalse(self._downloaded(_PRESENT_NAME))
+        self.assertEqual(repo.GetClientCacheStatistics()["hits"], 1)
+
+    def test_tampered_object_falls_back_to_http(self):
+        self._put(_PRESENT_NAME, "tampered")
+        repo = self._open()
+        self.assertEqual(repo.RetrieveFile(_PRESENT_NAME).read(), _PRESENT)
+        self.assertTrue(self._downloaded(_PRESENT_NAME))
+        statistics = repo.GetClientCacheStatistics()
+        self.assertEqual(statistics["rejected"], 1)
+        self.assertEqual(statistics["hits"], 0)
+
+    def test_statistics(self):
+        catalog_name = cvmfs._MakeObjectPath(_CATALOG_HASH, "C")
+        self._put(catalog_name, zlib.decompress(_CATALOG))
+        self._put(_PRESENT_NAME, "tampered")
+        repo = self._open()
+        self.assertEqual(repo.GetClientCacheStatistics(),
+                         { "hits" : 0, "misses" : 0, "rejected" : 0,
+                           "hit_ratio" : 0.0 })
+        self.assertTrue(repo.RetrieveRootCatalog().FindDirectoryEntry("").IsDirectory())
+        self.assertFalse(self._downloaded(catalog_name))
+        repo.RetrieveFile(_PRESENT_NAME)
+        self.assertRaises(HTTPError, repo.RetrieveFile, _MISSING_NAME)
+        self.assertEqual(repo.GetClientCacheStatistics(),
+                         { "hits" : 1, "misses" : 1, "rejected" : 1,
+                           "hit_ratio" : 1.0 / 3 })
+        self.assertTrue(cvmfs.RemoteRepository(self.mirror.url, self.cache_dir)
+                        .GetClientCacheStatistics() is None)
+
+
+class TestConcurrentLookups(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.mirror    = MockMirror(_FILES)
+
+    def tearDown(self):
+        self.mirror.break_down()
+        shutil.rmtree(self.cache_dir)
+
+    def test_threads_share_a_catalog(self):
+        repo   = cvmfs.RemoteRepository(self.mirror.url, self.cache_dir)
+        paths  = [ "", "/missing" ] * 50
+        errors = []
+        def lookup():
+            try:
+                for i in range(20):
+                    results = list(repo.LookupPaths(paths))
+                    if [ path for path, dirent in results ] != paths or \
+                       [ dirent is None for path, dirent in results ] != \
+                       [ bool(path) for path in paths ]:
+                        errors.append(results)
+            except Exception, e:
+                errors.append(e)
+        threads = [ threading.Thread(target = lookup) for i in range(8) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+
+class TestPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.files     = dict(_FILES)
+        self.nested    = []
+        for i in range(20):
+            path = "/n%d" % i
+            catalog_hash, catalog = _catalog(root_path = path)
+            self.files[cvmfs._MakeObjectPath(catalog_hash, "C")] = catalog
+            self.nested.append((path, catalog_hash))
+        root_hash, root = _catalog(nested = self.nested)
+        self.files[cvmfs._MakeObjectPath(root_hash, "C")] = root
+        self.files[".cvmfspublished"] = _manifest(root_hash)
+        self.mirror = MockMirror(self.files, delay = 0.1)
+
+    def tearDown(self):
+        self.mirror.break_down()
+        shutil.rmtree(self.cache_dir)
+
+    def test_needed_catalog_does_not_wait_for_the_queue(self):
+        repo = cvmfs.RemoteRepository(self.mirror.url, self.cache_dir)
+        repo.EnablePrefetch(workers = 1)
+        try:
+            repo.RetrieveRootCatalog()  # queues all 20 nested catalogs
+            start   = time.time()
+            catalog = repo.RetrieveCatalog(self.nested[-1][1])
+            # at most the running prefetch and the own download, not all 20
+            self.assertTrue(time.time() - start < 0.8)
+            self.assertEqual(catalog.FindDirectoryEntry("/n19").flags, 1 | 32)
+            # the others are still prefetched
+            deadline = time.time() + 10
+            while repo.prefetcher_.GetPrefetchedCount() < 19 and \
+                  time.time() < deadline:
+                time.sleep(0.05)
+            self.assertEqual(repo.prefetcher_.GetPrefetchedCount(), 19)
+        finally:
+            repo.DisablePrefetch()
+
+
+class TestCatalogTree(unittest.TestCase):
+    """ a root catalog with nested catalogs at /foo and /foobar """
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.files     = dict(_FILES)
+        self.foo_hash, foo = _catalog(root_path = "/foo",
+                                      entries = [ ("/foo/a", 4) ])
+        self.foobar_hash, foobar = _catalog(root_path = "/foobar", entries = [
+            ("/foobar/b", 4), ("/foobar/d", 1), ("/foobar/d/e", 4) ])
+        self.root_hash, root = _catalog(entries = [
+            ("/x", 1), ("/x/y", 4), ("/x/z", 1), ("/x/z/w", 4), ("/x/a", 1),
+            ("/x/a/v", 4), ("/b", 4), ("/fo", 1) ],
+            nested = [ ("/foo", self.foo_hash), ("/foobar", self.foobar_hash) ])
+        for catalog_hash, catalog in ((self.foo_hash, foo),
+                                      (self.foobar_hash, foobar),
+                                      (self.root_hash, root)):
+            self.files[cvmfs._MakeObjectPath(catalog_hash, "C")] = catalog
+        self.files[".cvmfspublished"] = _manifest(self.root_hash)
+        self.mirror = MockMirror(self.files)
+        self.repo   = cvmfs.RemoteRepository(self.mirror.url, self.cache_dir)
+
+    def tearDown(self):
+        self.mirror.break_down()
+        shutil.rmtree(self.cache_dir)
+
+    @staticmethod
+    def _walk(iterator):
+        return [ (path, dirent.md5path_1, dirent.md5path_2, dirent.name,
+                  dirent.flags) for path, dirent in iterator ]
+
+    def test_scan_iterator_matches_catalog_iterator(self):
+        for catalog_hash in (self.root_hash, self.foobar_hash):
+            catalog  = self.repo.RetrieveCatalog(catalog_hash)
+            expected = self._walk(cvmfs.CatalogIterator(catalog))
+            self.assertEqual(self._walk(cvmfs.CatalogScanIterator(catalog)),
+                             expected)
+        self.assertEqual([ walked[0] for walked in expected ],
+                         [ "/foobar", "/foobar/b", "/foobar/d", "/foobar/d/e" ])
+        root_paths = [ walked[0] for walked in
+                       self._walk(cvmfs.CatalogScanIterator(
+                         self.repo.RetrieveRootCatalog())) ]
+        self.assertEqual(root_paths, [ "", "/b", "/fo", "/foo", "/foobar", "/x",
+                                       "/x/a", "/x/y", "/x/z", "/x/a/v",
+                                       "/x/z/w" ])
+
+    def test_nested_catalog_prefixes_match_whole_components(self):
+        root = self.repo.RetrieveRootCatalog()
+        for path, expected in (("/foo", self.foo_hash),
+                               ("/foo/a", self.foo_hash),
+                               ("/foobar", self.foobar_hash),
+                               ("/foobar/d/e", self.foobar_hash),
+                               ("/fo", None), ("/foob", None), ("/x/y", None)):
+            reference = root.FindNestedForPath(path)
+            self.assertEqual(reference.hash if reference else None, expected)
+        self.assertEqual(self.repo.RetrieveCatalogForPath("/foobar/d/e").hash,
+                         self.foobar_hash)
+        self.assertEqual(self.repo.RetrieveCatalogForPath("/foo/a").hash,
+                         self.foo_hash)
+        self.assertEqual(self.repo.RetrieveCatalogForPath("/foob").hash,
+                         self.root_hash)
+
+    def test_lookup_paths_keeps_the_input_order(self):
+        paths   = [ "/foobar/d/e", "/x/y", "/foo/a", "/missing", "/foobar/b",
+                    "", "/foo/missing", "/x/z/", "/foo" ]
+        results = list(self.repo.LookupPaths(paths))
+        self.assertEqual([ path for path, dirent in results ], paths)
+        self.assertEqual([ dirent.name if dirent else None
+                           for path, dirent in results ],
+                         [ "e", "y", "a", None, "b", "", None, "z", "foo" ])
+
+
+if __name__ == "__main__":
+    unittest.main()
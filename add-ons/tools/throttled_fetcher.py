@@ -0,0 +1,34 @@
+"""
+python-cvmfsutils fetcher whose downloads go through a DownloadScheduler
+(kept apart from download_scheduler, which does not need python-cvmfsutils)
+"""
+
+import urlparse
+
+import cvmfs
+import download_scheduler
+
+
+class ThrottledRemoteFetcher(cvmfs.RemoteFetcher):
+    """ RemoteFetcher whose downloads go through a DownloadScheduler """
+    def __init__(self, repo_url, scheduler = None):
+        super(ThrottledRemoteFetcher, self).__init__(repo_url)
+        self.scheduler = scheduler or download_scheduler.DownloadScheduler()
+
+    def _download_content_and_store(self, cached_file, file_url):
+        host     = urlparse.urlparse(file_url).netloc
+        priority = download_scheduler.priority_for(file_url)
+        self.scheduler.acquire_request(host, priority)
+        writer   = download_scheduler.ThrottledWriter(cached_file, self.scheduler,
+                                                      host, priority)
+        super(ThrottledRemoteFetcher, self)._download_content_and_store(writer,
+                                                                        file_url)
+
+
+def open_repository(repo_identifier, scheduler):
+    """ like cvmfs.open_repository() but remote downloads are scheduled """
+    if repo_identifier.startswith("http://") or \
+       repo_identifier.startswith("https://"):
+        fetcher = ThrottledRemoteFetcher(repo_identifier, scheduler)
+        return cvmfs.Repository.with_custom_fetcher(fetcher)
+    return cvmfs.open_repository(repo_identifier)